@@ -1,11 +1,16 @@
 import os
+import time
 import json
-import shutil
+import threading
 from functools import wraps
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_file
+from flask import Flask, render_template, request, redirect, url_for, flash, session, Response, jsonify, abort
 import zipfile
-import pandas as pd
-import seat_plan_generator as spg  # This module contains the PDF-generation code
+import jobs
+import metrics
+# seat_plan_generator (the PDF-generation code) pulls in pandas, fpdf and,
+# when extracting, pdfplumber. It is imported inside the functions that
+# merge or generate, so a worker boots and serves login and dashboard pages
+# without loading any of them. See warm_up() below.
 
 app = Flask(__name__)
 app.secret_key = "my-fixed-secret-key-please-change"
@@ -18,13 +23,36 @@ default_users = {
 }
 USERS = json.loads(os.environ.get("USERS_CREDENTIALS", json.dumps(default_users)))
 
-def get_session_folder():
-    username = session.get("username", "default")
+def get_user_folder(username):
     folder = os.path.join(os.getcwd(), "uploads", username)
     if not os.path.exists(folder):
         os.makedirs(folder, exist_ok=True)
     return folder
 
+def get_user_context(username, output_folder=None):
+    """GenerationContext with this user's uploads and merged roster.
+
+    Generation jobs pass their own scratch output_folder.
+    """
+    import seat_plan_generator as spg
+    folder = get_user_folder(username)
+    data_folder = os.path.join(folder, "merged")
+    return spg.GenerationContext(
+        pdf_input_folder=folder,
+        merged_excel_path=os.path.join(data_folder, "merged_excel.xlsx"),
+        output_folder=output_folder or os.path.join(spg.OUTPUT_FOLDER, username),
+        room_info_path_file=os.path.join(data_folder, "room_info_path.txt"),
+    )
+
+# Uploads for one user rewrite that user's folder and merged roster, so
+# they take turns; generation jobs only read them.
+USER_LOCKS = {}
+USER_LOCKS_GUARD = threading.Lock()
+
+def get_user_lock(username):
+    with USER_LOCKS_GUARD:
+        return USER_LOCKS.setdefault(username, threading.Lock())
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -62,156 +90,296 @@ def logout():
 def dashboard():
     return render_template("dashboard.html")
 
-def clear_output_folder():
-    output = spg.OUTPUT_FOLDER  # defined in spg module
-    persistent_file = os.path.join(output, "room_info_path.txt")
-    if os.path.exists(output):
-        for root, dirs, files in os.walk(output):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if os.path.abspath(file_path) == os.path.abspath(persistent_file):
-                    continue
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    print(f"Error deleting {file_path}: {e}")
-        print(f"Cleared files (except room_info_path.txt) in the output folder: {output}")
-    else:
-        os.makedirs(output, exist_ok=True)
-    os.makedirs(spg.SEAT_PLAN_OUTPUT_FOLDER, exist_ok=True)
-    os.makedirs(spg.ATTENDANCE_OUTPUT_FOLDER, exist_ok=True)
+class ZipStreamSink:
+    """Write-only, unseekable file object that hands zip bytes to a generator."""
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def stream_zip(files):
+    """Yield a zip archive chunk by chunk as (file_path, arcname) pairs arrive.
+
+    PDFs are already compressed, so they are STORED rather than deflated.
+    """
+    sink = ZipStreamSink()
+    with zipfile.ZipFile(sink, "w") as zipf:
+        for file_path, arcname in files:
+            compress_type = zipfile.ZIP_STORED if file_path.lower().endswith(".pdf") else zipfile.ZIP_DEFLATED
+            with metrics.timed("zip_write_seconds"):
+                zipf.write(file_path, arcname, compress_type=compress_type)
+            metrics.increment("zip_files_total")
+            metrics.increment("zip_bytes_total", os.path.getsize(file_path))
+            yield sink.drain()
+    yield sink.drain()
+
+def is_inside(path, folder):
+    return os.path.abspath(path).startswith(os.path.abspath(folder) + os.sep)
 
 @app.route("/upload_files", methods=["GET", "POST"])
 @login_required
 def upload_files():
+    username = session.get("username", "default")
+    base_dir = get_user_folder(username)
     if request.method == "POST":
-        base_dir = get_session_folder()
-        for filename in os.listdir(base_dir):
-            file_path = os.path.join(base_dir, filename)
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
-        pdf_files = request.files.getlist("pdf_input")
-        for pdf in pdf_files:
-            if pdf and pdf.filename.lower().endswith(".pdf"):
-                pdf_path = os.path.join(base_dir, pdf.filename)
-                pdf.save(pdf_path)
-                print("Saved PDF:", pdf_path)
-        excel_file = request.files.get("room_info")
-        excel_path = None
-        if excel_file and excel_file.filename.lower().endswith((".xls", ".xlsx")):
-            excel_path = os.path.join(base_dir, excel_file.filename)
-            excel_file.save(excel_path)
-            print("Saved room info Excel file as:", excel_path)
-        else:
-            print("No room info Excel file uploaded.")
-        spg.PDF_INPUT_FOLDER = base_dir
-        if excel_path:
-            room_info_file = os.path.join(spg.OUTPUT_FOLDER, "room_info_path.txt")
-            with open(room_info_file, "w") as f:
-                f.write(excel_path)
-            print("Updated persistent ROOM_INFO_PATH to:", excel_path)
-        else:
-            print("ROOM_INFO_PATH not updated, using default:", spg.ROOM_INFO_PATH)
-        spg.merge_pdf_data_to_excel()
+        import seat_plan_generator as spg
+        ctx = get_user_context(username)
+        # "Keep" mode only adds, replaces or removes the rosters named in this
+        # request; the merge then re-reads just those files.
+        keep_existing = request.form.get("keep_existing") == "on"
+        remove = {os.path.basename(name) for name in request.form.getlist("remove_roster")}
+        with get_user_lock(username):
+            for filename in os.listdir(base_dir):
+                file_path = os.path.join(base_dir, filename)
+                if os.path.isfile(file_path) and (not keep_existing or filename in remove):
+                    os.unlink(file_path)
+                    print("Removed:", file_path)
+            pdf_files = request.files.getlist("pdf_input")
+            for pdf in pdf_files:
+                if pdf and pdf.filename.lower().endswith(".pdf"):
+                    pdf_path = os.path.join(base_dir, os.path.basename(pdf.filename))
+                    pdf.save(pdf_path)
+                    print("Saved PDF:", pdf_path)
+            excel_file = request.files.get("room_info")
+            excel_path = None
+            if excel_file and excel_file.filename.lower().endswith((".xls", ".xlsx")):
+                excel_path = os.path.join(base_dir, os.path.basename(excel_file.filename))
+                excel_file.save(excel_path)
+                print("Saved room info Excel file as:", excel_path)
+            else:
+                print("No room info Excel file uploaded.")
+            if excel_path:
+                ctx.set_room_info_path(excel_path)
+                print("Updated persistent ROOM_INFO_PATH to:", excel_path)
+            else:
+                print("ROOM_INFO_PATH not updated, using:", ctx.get_room_info_path())
+            failures = spg.merge_pdf_data_to_excel(ctx=ctx)
+            spg.precompute_seat_assignments(ctx)
+        for file_name, error in failures:
+            flash(f"Could not read {file_name}: {error}")
         flash("PDFs merged into Excel successfully! Now you can generate any PDF.")
         return redirect(url_for("upload_files"))
-    return render_template("upload_files.html")
+    rosters = sorted(name for name in os.listdir(base_dir) if name.lower().endswith(".pdf"))
+    return render_template("upload_files.html", rosters=rosters)
+
+# ============================================================
+# BACKGROUND GENERATION JOBS
+# ============================================================
+DOWNLOAD_NAMES = {
+    "seat_plan": "seat_plan_output.zip",
+    "attendance": "attendance_output.zip",
+    "summary": "summary_output.zip",
+    "envelopes": "envelopes_output.zip",
+    "all": "all_documents.zip",
+}
+
+def prepare_generation(kind, params, ctx):
+    """Apply a job's form settings to ctx and return (generate, arc_root, include) for it."""
+    import seat_plan_generator as spg
+    if kind == "seat_plan":
+        ctx.set_seatplan_headers(params["line1"], params["line2"])
+        return (lambda: spg.generate_seat_plan_only(combined=params["combined"], ctx=ctx),
+                ctx.seat_plan_output_folder,
+                lambda path: is_inside(path, ctx.seat_plan_output_folder))
+    if kind == "attendance":
+        ctx.set_attendance_headers(params["line1"], params["line2"])
+        ctx.set_attendance_program(params["program"])
+        return (lambda: spg.generate_attendance_only(combined=params["combined"], ctx=ctx),
+                ctx.output_folder,
+                lambda path: is_inside(path, ctx.attendance_output_folder))
+    if kind == "summary":
+        ctx.set_summary_headers(params["line1"], params["line2"], params["line3"])
+        return (lambda: spg.generate_summary_only(ctx), ctx.output_folder,
+                lambda path: "Summary" in os.path.basename(path))
+    if kind == "envelopes":
+        ctx.set_envelopes_headers(params["line1"], params["line2"], params["line3"], params["line4"])
+        return (lambda: spg.generate_envelopes_only(ctx), ctx.output_folder,
+                lambda path: "Envelopes" in os.path.basename(path))
+    if kind == "all":
+        ctx.set_seatplan_headers(params["seatplan_line1"], params["seatplan_line2"])
+        ctx.set_attendance_headers(params["attendance_line1"], params["attendance_line2"])
+        ctx.set_attendance_program(params["program"])
+        ctx.set_summary_headers(params["summary_line1"], params["summary_line2"], params["summary_line3"])
+        ctx.set_envelopes_headers(params["envelopes_line1"], params["envelopes_line2"],
+                                  params["envelopes_line3"], params["envelopes_line4"])
+        return (lambda: spg.generate_all(combined=params["combined"], ctx=ctx), ctx.output_folder,
+                lambda path: is_inside(path, ctx.output_folder))
+    raise ValueError(f"Unknown job kind: {kind}")
+
+def run_generation_job(job, report_progress):
+    """Generate a job's files in its own scratch folder and return them with their archive names."""
+    ctx = get_user_context(job["owner"], output_folder=job["work_dir"])
+    ctx.make_output_folders()
+    generate, arc_root, include = prepare_generation(job["kind"], job["params"], ctx)
+    produced = []
+
+    def collect(path):
+        if include(path) and path not in produced:
+            produced.append(path)
+            report_progress(len(produced), f"{len(produced)} file(s) generated")
+
+    ctx.output_listeners.append(collect)
+    with metrics.timed("job_seconds", kind=job["kind"]):
+        generate()
+    return [(path, os.path.relpath(path, arc_root)) for path in produced if os.path.exists(path)]
+
+# Workers start with the process, not on the first submission, so jobs left
+# queued (or requeued as stale) by a restarted worker are picked up and the
+# janitor runs even in a process that never takes a submission.
+job_queue = jobs.JobQueue(jobs.JOBS_FOLDER, run_generation_job)
+job_queue.start()
+
+def wants_json():
+    return request.args.get("format") == "json" or request.accept_mimetypes.best == "application/json"
+
+def enqueue_generation(kind, params):
+    """Queue a generation job and answer with its id (JSON) or its status page (HTML)."""
+    import seat_plan_generator as spg
+    username = session.get("username", "default")
+    ctx = get_user_context(username)
+    inputs = [ctx.merged_excel_path, spg.get_merged_store_path(ctx), ctx.get_room_info_path()]
+    job_id = job_queue.submit(kind, params, username, jobs.input_key(kind, params, username, inputs))
+    if wants_json():
+        return jsonify(job_id=job_id,
+                       status_url=url_for("job_status", job_id=job_id),
+                       download_url=url_for("job_download", job_id=job_id)), 202
+    return redirect(url_for("job_page", job_id=job_id))
+
+def get_own_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job["owner"] != session.get("username"):
+        abort(404)
+    return job
+
+@app.route("/jobs/<job_id>")
+@login_required
+def job_page(job_id):
+    job = get_own_job(job_id)
+    return render_template("job_status.html", job=job)
+
+@app.route("/jobs/<job_id>/status")
+@login_required
+def job_status(job_id):
+    job = get_own_job(job_id)
+    status = {key: job[key] for key in ("id", "kind", "status", "progress", "message", "error")}
+    if job["status"] == jobs.DONE:
+        status["download_url"] = url_for("job_download", job_id=job_id)
+    return jsonify(status)
+
+@app.route("/jobs/<job_id>/download")
+@login_required
+def job_download(job_id):
+    job = get_own_job(job_id)
+    if job["status"] != jobs.DONE:
+        return jsonify(error=f"Job is {job['status']}."), 409
+    download_name = DOWNLOAD_NAMES[job["kind"]]
+    print("Streaming zip file:", download_name)
+    return Response(stream_zip(job_queue.job_files(job_id)), mimetype="application/zip",
+                    headers={"Content-Disposition": f"attachment; filename={download_name}"})
 
 @app.route("/generate_seat_plan", methods=["GET", "POST"])
 @login_required
 def generate_seat_plan_pdf():
     if request.method == "POST":
-        clear_output_folder()
-        base_dir = get_session_folder()
-        spg.PDF_INPUT_FOLDER = base_dir
-        line1 = request.form.get("line1")
-        line2 = request.form.get("line2")
-        spg.set_custom_seatplan_headers(line1, line2)
-        spg.generate_seat_plan_only()
-        output_zip_path = os.path.join(base_dir, "seat_plan_output.zip")
-        with zipfile.ZipFile(output_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(spg.SEAT_PLAN_OUTPUT_FOLDER):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, spg.SEAT_PLAN_OUTPUT_FOLDER)
-                    zipf.write(file_path, arcname)
-        print("Created zip file:", output_zip_path)
-        return send_file(output_zip_path, as_attachment=True)
+        return enqueue_generation("seat_plan", {
+            "line1": request.form.get("line1"),
+            "line2": request.form.get("line2"),
+            "combined": request.form.get("combined") == "on",
+        })
     return render_template("seat_plan_form.html")
 
 @app.route("/generate_attendance", methods=["GET", "POST"])
 @login_required
 def generate_attendance_pdf():
     if request.method == "POST":
-        clear_output_folder()
-        base_dir = get_session_folder()
-        spg.PDF_INPUT_FOLDER = base_dir
-        line1 = request.form.get("line1")
-        line2 = request.form.get("line2")
-        program = request.form.get("program")  # New attendance program field
-        spg.set_custom_attendance_headers(line1, line2)
-        spg.set_custom_attendance_program(program)
-        spg.generate_attendance_only()
-        output_zip_path = os.path.join(base_dir, "attendance_output.zip")
-        with zipfile.ZipFile(output_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            attendance_folder = os.path.join(spg.OUTPUT_FOLDER, "Attendance_Sheets")
-            for root, dirs, files in os.walk(attendance_folder):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, spg.OUTPUT_FOLDER)
-                    zipf.write(file_path, arcname)
-        print("Created attendance zip file:", output_zip_path)
-        return send_file(output_zip_path, as_attachment=True)
+        return enqueue_generation("attendance", {
+            "line1": request.form.get("line1"),
+            "line2": request.form.get("line2"),
+            "program": request.form.get("program"),  # New attendance program field
+            "combined": request.form.get("combined") == "on",
+        })
     return render_template("attendance_form.html")
 
 @app.route("/generate_summary", methods=["GET", "POST"])
 @login_required
 def generate_summary_pdf_route():
     if request.method == "POST":
-        clear_output_folder()
-        base_dir = get_session_folder()
-        spg.PDF_INPUT_FOLDER = base_dir
-        line1 = request.form.get("line1")
-        line2 = request.form.get("line2")
-        line3 = request.form.get("line3")
-        spg.set_custom_summary_headers(line1, line2, line3)
-        spg.generate_summary_only()
-        output_zip_path = os.path.join(base_dir, "summary_output.zip")
-        with zipfile.ZipFile(output_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(spg.OUTPUT_FOLDER):
-                for file in files:
-                    if "Summary" in file:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, spg.OUTPUT_FOLDER)
-                        zipf.write(file_path, arcname)
-        print("Created summary zip file:", output_zip_path)
-        return send_file(output_zip_path, as_attachment=True)
+        return enqueue_generation("summary", {
+            "line1": request.form.get("line1"),
+            "line2": request.form.get("line2"),
+            "line3": request.form.get("line3"),
+        })
     return render_template("summary_form.html")
 
 @app.route("/generate_envelopes", methods=["GET", "POST"])
 @login_required
 def generate_envelopes_pdf_route():
     if request.method == "POST":
-        clear_output_folder()
-        base_dir = get_session_folder()
-        spg.PDF_INPUT_FOLDER = base_dir
-        line1 = request.form.get("line1")
-        line2 = request.form.get("line2")
-        line3 = request.form.get("line3")
-        line4 = request.form.get("line4")
-        spg.set_custom_envelopes_headers(line1, line2, line3, line4)
-        spg.generate_envelopes_only()
-        output_zip_path = os.path.join(base_dir, "envelopes_output.zip")
-        with zipfile.ZipFile(output_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            for root, dirs, files in os.walk(spg.OUTPUT_FOLDER):
-                for file in files:
-                    if "Envelopes" in file:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, spg.OUTPUT_FOLDER)
-                        zipf.write(file_path, arcname)
-        print("Created envelopes zip file:", output_zip_path)
-        return send_file(output_zip_path, as_attachment=True)
+        return enqueue_generation("envelopes", {
+            "line1": request.form.get("line1"),
+            "line2": request.form.get("line2"),
+            "line3": request.form.get("line3"),
+            "line4": request.form.get("line4"),
+        })
     return render_template("envelopes_form.html")
 
+@app.route("/generate_all", methods=["GET", "POST"])
+@login_required
+def generate_all_route():
+    if request.method == "POST":
+        fields = ["seatplan_line1", "seatplan_line2", "attendance_line1", "attendance_line2", "program",
+                  "summary_line1", "summary_line2", "summary_line3",
+                  "envelopes_line1", "envelopes_line2", "envelopes_line3", "envelopes_line4"]
+        params = {field: request.form.get(field) for field in fields}
+        params["combined"] = request.form.get("combined") == "on"
+        return enqueue_generation("all", params)
+    return render_template("all_documents_form.html")
+
+# ============================================================
+# METRICS
+# ============================================================
+# Stage timings and counters for this process (each gunicorn worker keeps its
+# own). Only answered on the loopback interface.
+@app.route("/metrics")
+def metrics_endpoint():
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        abort(404)
+    if wants_json():
+        return jsonify(metrics.snapshot())
+    return Response(metrics.render_text(), mimetype="text/plain; version=0.0.4")
+
+# ============================================================
+# WARM-UP
+# ============================================================
+# With WARM_UP=1 each worker imports the generator and its libraries in a
+# background thread right after it starts, so the first upload or generation
+# request does not wait for them while boot and login stay fast.
+def warm_up():
+    """Import everything the extraction and generation paths load lazily."""
+    started = time.perf_counter()
+    import seat_plan_generator
+    import pdfplumber
+    from dateutil import parser
+    metrics.observe("warm_up_seconds", time.perf_counter() - started)
+    print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+if os.environ.get("WARM_UP") == "1":
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
 if __name__ == "__main__":
     app.run(debug=True, use_reloader=False)
@@ -0,0 +1,213 @@
+"""Benchmark the seat plan pipeline on synthetic rosters and room layouts.
+
+    python benchmark.py                      # 1k, 10k and 50k students
+    python benchmark.py --sizes 1000 --output bench.json
+
+Each size gets its own temporary workspace with generated roster PDFs (the
+"Faculty ID / Batch Number / Course Code" header plus a bordered student
+table) and a room_info.xlsx with enough rooms to seat everyone. Every stage
+is timed with the extraction and render caches switched off, and the
+results are written as JSON along with how long a fresh interpreter takes to
+import the web app and the generator.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+import pandas as pd
+from fpdf import FPDF
+import seat_plan_generator as spg
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+BATCHES = [29, 30, 31, 32, 33, 34, 35, 36]
+
+# ============================================================
+# SYNTHETIC DATA
+# ============================================================
+def make_roster_pdf(path, faculty_id, faculty_name, batch, course_code, course_title, credits, section, students):
+    """Write a roster PDF laid out like the university's course rosters."""
+    pdf = FPDF("P", "mm", "A4")
+    pdf.set_auto_page_break(True, margin=15)
+    pdf.add_page()
+    pdf.set_font("Arial", "", 10)
+    pdf.cell(0, 6, "Program BSc in Civil Engineering (For Diploma", ln=True)
+    pdf.cell(0, 6, "Holder)", ln=True)
+    pdf.cell(0, 6, f"Faculty ID {faculty_id} Faculty Name {faculty_name}", ln=True)
+    pdf.cell(0, 6, f"Batch Number {batch}", ln=True)
+    pdf.cell(0, 6, f"Course Code {course_code}", ln=True)
+    pdf.cell(0, 6, f"Course Title {course_title} Credits {credits}", ln=True)
+    pdf.cell(0, 6, f"Section {section}", ln=True)
+    pdf.ln(4)
+    widths = [12, 35, 70, 20, 40]
+    for header, width in zip(["SL", "Student ID", "Student Name", "M Batch", "Remarks"], widths):
+        pdf.cell(width, 7, header, border=1)
+    pdf.ln()
+    for i, (student_id, name, m_batch) in enumerate(students, 1):
+        for value, width in zip([str(i), student_id, name, str(m_batch), ""], widths):
+            pdf.cell(width, 7, value, border=1)
+        pdf.ln()
+    pdf.output(path)
+
+def make_rosters(folder, students, per_roster=50, seed=1):
+    """Write roster PDFs for `students` distinct students; returns the number of files."""
+    rnd = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    written = 0
+    index = 0
+    while written < students:
+        count = min(students - written, rnd.randint(per_roster // 2, per_roster * 3 // 2))
+        batch = BATCHES[index % len(BATCHES)]
+        roster = []
+        for _ in range(count):
+            written += 1
+            m_batch = batch if rnd.random() < 0.85 else batch + 1
+            mid = "38" if rnd.random() < 0.1 else "39"
+            student_id = f"22{m_batch % 100:02d}{mid}{written:05d}"
+            roster.append((student_id, f"STUDENT NAME {written}", m_batch))
+        make_roster_pdf(os.path.join(folder, f"roster_{index:05d}.pdf"), 240000 + index % 40,
+                        f"Teacher Number {index % 40}", batch, f"CE{4000 + index}",
+                        f"COURSE TITLE {index} OF ENGINEERING", "3.0", "ABC"[index % 3], roster)
+        index += 1
+    return index
+
+def make_room_info(path, students, rows=6, cols=6, slack=1.1):
+    """Write a room_info sheet with enough rows x cols rooms for `students` plus slack."""
+    capacity = rows * cols
+    room_count = max(1, int(students * slack / capacity) + 1)
+    rooms = pd.DataFrame({
+        "Room": [str(101 + i) for i in range(room_count)],
+        "Row": [rows] * room_count,
+        "Column": [cols] * room_count,
+    })
+    rooms.to_excel(path, index=False)
+    return room_count
+
+# ============================================================
+# BENCHMARK RUN
+# ============================================================
+def timed(stages, name, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    stages[name] = round(time.perf_counter() - start, 4)
+    print(f"  {name}: {stages[name]:.2f}s")
+    return result
+
+def count_files(folder):
+    return sum(len(names) for _, _, names in os.walk(folder))
+
+def measure_startup(repeat=3):
+    """Best-of-`repeat` wall time for a fresh interpreter to import each module, minus bare startup."""
+    repo = os.path.dirname(os.path.abspath(__file__))
+    statements = {"interpreter": "pass", "app": "import app", "seat_plan_generator": "import seat_plan_generator"}
+    best = {}
+    for name, statement in statements.items():
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", statement], cwd=repo, check=True, stdout=subprocess.DEVNULL)
+            runs.append(time.perf_counter() - start)
+        best[name] = min(runs)
+    startup = {name: round(seconds - best["interpreter"], 4) for name, seconds in best.items() if name != "interpreter"}
+    for name, seconds in startup.items():
+        print(f"  import {name}: {seconds:.2f}s")
+    return startup
+
+def run_size(students, workspace, args):
+    pdf_folder = os.path.join(workspace, "rosters")
+    ctx = spg.GenerationContext(
+        pdf_input_folder=pdf_folder,
+        merged_excel_path=os.path.join(workspace, "merged", "merged_excel.xlsx"),
+        output_folder=os.path.join(workspace, "output"),
+        room_info_path_file=os.path.join(workspace, "merged", "room_info_path.txt"),
+    )
+    ctx.make_output_folders()
+    room_info_path = os.path.join(workspace, "room_info.xlsx")
+    setup = {}
+    rosters = timed(setup, "make_rosters", make_rosters, pdf_folder, students, args.per_roster)
+    rooms = timed(setup, "make_room_info", make_room_info, room_info_path, students, args.room_rows, args.room_cols)
+    ctx.set_room_info_path(room_info_path)
+
+    stages = {}
+    failures = timed(stages, "merge_pdf_data_to_excel", spg.merge_pdf_data_to_excel, args.ingest_workers, ctx)
+    df_students = timed(stages, "load_merged_students", spg.load_merged_students, ctx)
+    timed(stages, "read_excel_merged", pd.read_excel, ctx.merged_excel_path)
+    df_rooms = timed(stages, "read_excel_rooms", pd.read_excel, room_info_path)
+    seat_assignments = timed(stages, "generate_seating_plan_display", spg.generate_seating_plan_display,
+                             df_students, df_rooms, {}, ctx.output_folder, False, ctx)
+    timed(stages, "get_summary_data", spg.get_summary_data, df_students.copy(), seat_assignments)
+    timed(stages, "render_seat_plans", spg.generate_seating_plan_pdfs,
+          df_students, df_rooms, seat_assignments, {}, False, ctx)
+    timed(stages, "render_attendance_sheets", spg.generate_attendance_sheets,
+          df_students, {}, seat_assignments, ctx.output_folder, False, ctx)
+    timed(stages, "render_summary", spg.generate_summary_pdf,
+          df_students, seat_assignments, {}, os.path.join(ctx.output_folder, "Summary.pdf"), ctx)
+    envelopes = spg.generate_envelope_data(df_students)
+    timed(stages, "render_envelopes", spg.generate_envelopes_pdf,
+          envelopes, {}, os.path.join(ctx.output_folder, "Envelopes.pdf"), ctx)
+    return {
+        "students": students,
+        "setup_seconds": setup,
+        "stages_seconds": stages,
+        "total_seconds": round(sum(stages.values()), 4),
+        "counts": {
+            "roster_files": rosters,
+            "roster_failures": len(failures),
+            "merged_rows": len(df_students),
+            "rooms": rooms,
+            "seats_assigned": len(seat_assignments),
+            "seat_plan_pdfs": count_files(ctx.seat_plan_output_folder),
+            "attendance_pdfs": count_files(ctx.attendance_output_folder),
+            "envelopes": len(envelopes),
+        },
+    }
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                            help="comma-separated student counts (default: %(default)s)")
+    arg_parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    arg_parser.add_argument("--per-roster", type=int, default=50, help="average students per roster PDF")
+    arg_parser.add_argument("--room-rows", type=int, default=6)
+    arg_parser.add_argument("--room-cols", type=int, default=6)
+    arg_parser.add_argument("--ingest-workers", type=int, default=spg.PDF_INGEST_WORKERS)
+    arg_parser.add_argument("--render-workers", type=int, default=spg.RENDER_WORKERS)
+    arg_parser.add_argument("--keep", action="store_true", help="keep the generated workspaces")
+    args = arg_parser.parse_args(argv)
+
+    # Measure the real work, not cache hits.
+    spg.EXTRACTION_CACHE_MAX_BYTES = 0
+    spg.RENDER_CACHE_MAX_BYTES = 0
+    spg.RENDER_WORKERS = args.render_workers
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pandas": pd.__version__,
+        "ingest_workers": args.ingest_workers,
+        "render_workers": args.render_workers,
+        "startup_seconds": {},
+        "runs": [],
+    }
+    print("Measuring startup")
+    results["startup_seconds"] = measure_startup()
+    for students in [int(size) for size in args.sizes.split(",") if size.strip()]:
+        workspace = tempfile.mkdtemp(prefix=f"seatplan_bench_{students}_")
+        print(f"Benchmarking {students} students in {workspace}")
+        try:
+            results["runs"].append(run_size(students, workspace, args))
+        finally:
+            if not args.keep:
+                shutil.rmtree(workspace, ignore_errors=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return results
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
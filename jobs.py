@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+# ============================================================
+# BACKGROUND GENERATION JOBS
+# ============================================================
+# Jobs are kept in a SQLite file so any gunicorn worker can answer status
+# and download requests, and run on a small pool of local threads, so no
+# external broker is needed.
+JOBS_FOLDER = os.environ.get("JOBS_FOLDER", os.path.join(os.getcwd(), "jobs"))
+JOB_WORKERS = max(1, int(os.environ.get("JOB_WORKERS", "1")))
+JOB_POLL_INTERVAL = 0.5
+# A running job whose heartbeat has not moved for this long is assumed to
+# belong to a worker that died and is put back on the queue. Live jobs touch
+# their row every JOB_HEARTBEAT_SECONDS, well inside that window.
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", "900"))
+JOB_HEARTBEAT_SECONDS = max(1, JOB_STALE_SECONDS // 3)
+# Finished and failed jobs (and their files) are removed this long after
+# they last changed; the janitor checks every JOB_JANITOR_INTERVAL seconds.
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", str(6 * 3600)))
+JOB_JANITOR_INTERVAL = int(os.environ.get("JOB_JANITOR_INTERVAL", "600"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+def input_key(kind, params, owner, input_paths):
+    """Hash everything a job's output depends on, used to spot duplicate submissions."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([kind, params, owner], sort_keys=True).encode("utf-8"))
+    for path in input_paths:
+        try:
+            stat = os.stat(path)
+            state = [path, stat.st_size, stat.st_mtime_ns]
+        except OSError:
+            state = [path, None, None]
+        digest.update(json.dumps(state).encode("utf-8"))
+    return digest.hexdigest()
+
+class JobQueue:
+    def __init__(self, folder, runner, workers=JOB_WORKERS):
+        """runner(job, report_progress) writes its output under job["work_dir"] and
+        returns the (file_path, arcname) pairs that make up the job's archive.
+        """
+        self.folder = folder
+        self.db_path = os.path.join(folder, "jobs.sqlite3")
+        self.runner = runner
+        self.workers = workers
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(self.folder, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        if not self._ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT, owner TEXT, params TEXT,"
+                " input_key TEXT, status TEXT, progress INTEGER DEFAULT 0,"
+                " message TEXT DEFAULT '', error TEXT DEFAULT '',"
+                " created_at REAL, updated_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_input_key ON jobs (input_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self._ready = True
+        return conn
+
+    def files_dir(self, job_id):
+        return os.path.join(self.folder, job_id, "files")
+
+    def work_dir(self, job_id):
+        return os.path.join(self.folder, job_id, "work")
+
+    def _as_dict(self, row):
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["files_dir"] = self.files_dir(job["id"])
+        job["work_dir"] = self.work_dir(job["id"])
+        return job
+
+    def submit(self, kind, params, owner, key):
+        """Queue a job and return its id, reusing a live or finished job with the same inputs."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE input_key = ? AND status != ? ORDER BY created_at DESC",
+                (key, FAILED),
+            ).fetchall()
+            for row in rows:
+                if row["status"] != DONE or os.path.isdir(self.files_dir(row["id"])):
+                    conn.execute("COMMIT")
+                    print(f"Reusing job {row['id']} for duplicate {kind} submission")
+                    return row["id"]
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (id, kind, owner, params, input_key, status, message, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, json.dumps(params, sort_keys=True), key, QUEUED, "Waiting in queue", now, now),
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        print(f"Queued {kind} job {job_id}")
+        return job_id
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return self._as_dict(row) if row else None
+
+    def _update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        conn = self._connect()
+        try:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        finally:
+            conn.close()
+
+    def report_progress(self, job_id, progress, message=""):
+        self._update(job_id, progress=progress, message=message)
+
+    def job_files(self, job_id):
+        """Return (file_path, arcname) pairs for a finished job's archive."""
+        root = self.files_dir(job_id)
+        files = []
+        for folder, dirs, names in os.walk(root):
+            dirs.sort()
+            for name in sorted(names):
+                path = os.path.join(folder, name)
+                files.append((path, os.path.relpath(path, root)))
+        return files
+
+    def _heartbeat(self, job_id, stopped):
+        """Keep a running job's updated_at fresh so it is never mistaken for an orphan."""
+        while not stopped.wait(JOB_HEARTBEAT_SECONDS):
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?",
+                    (time.time(), job_id, RUNNING),
+                )
+            except sqlite3.Error as e:
+                print(f"Error updating heartbeat for job {job_id}: {e}")
+            finally:
+                conn.close()
+
+    def _claim_next(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            stale = time.time() - JOB_STALE_SECONDS
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ? WHERE status = ? AND updated_at < ?",
+                (QUEUED, "Requeued after worker stopped", RUNNING, stale),
+            )
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, message = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, "Started", time.time(), row["id"]),
+                )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        return self._as_dict(row) if row else None
+
+    def _publish(self, job, files):
+        """Move a job's output into its files folder with one rename, so downloads never see it half-written."""
+        staging = job["files_dir"] + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for path, arcname in files:
+            target = os.path.join(staging, arcname)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        shutil.rmtree(job["files_dir"], ignore_errors=True)
+        os.replace(staging, job["files_dir"])
+
+    def _run(self, job):
+        print(f"Running {job['kind']} job {job['id']}")
+        shutil.rmtree(job["work_dir"], ignore_errors=True)
+        os.makedirs(job["work_dir"])
+        stopped = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job["id"], stopped), daemon=True)
+        heartbeat.start()
+        try:
+            files = self.runner(job, lambda progress, message="": self.report_progress(job["id"], progress, message))
+            if files:
+                self._publish(job, files)
+        except Exception as e:
+            print(f"Job {job['id']} failed: {e}")
+            self._update(job["id"], status=FAILED, error=str(e), message="Failed")
+            return
+        finally:
+            stopped.set()
+            heartbeat.join()
+            shutil.rmtree(job["work_dir"], ignore_errors=True)
+        if not files:
+            self._update(job["id"], status=FAILED, error="No files were generated.", message="Failed")
+            return
+        self._update(job["id"], status=DONE, message="Finished")
+        print(f"Finished {job['kind']} job {job['id']}")
+
+    def _worker_loop(self):
+        while True:
+            try:
+                job = self._claim_next()
+            except sqlite3.Error as e:
+                print(f"Error reading job queue: {e}")
+                job = None
+            if job is None:
+                time.sleep(JOB_POLL_INTERVAL)
+                continue
+            self._run(job)
+
+    def sweep(self, ttl=JOB_TTL_SECONDS):
+        """Delete finished or failed jobs, and their folders, older than ttl seconds."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (DONE, FAILED, time.time() - ttl),
+            ).fetchall()
+            for row in rows:
+                shutil.rmtree(os.path.join(self.folder, row["id"]), ignore_errors=True)
+                conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        finally:
+            conn.close()
+        if rows:
+            print(f"Removed {len(rows)} expired job(s)")
+        return len(rows)
+
+    def _janitor_loop(self):
+        while True:
+            try:
+                self.sweep()
+            except (OSError, sqlite3.Error) as e:
+                print(f"Error cleaning up jobs: {e}")
+            time.sleep(JOB_JANITOR_INTERVAL)
+
+    def start(self):
+        """Start the worker threads and the janitor for this process (once)."""
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._janitor_loop, name="job-janitor", daemon=True)
+            thread.start()
+            self._threads.append(thread)
@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# ============================================================
+# IN-PROCESS METRICS (timings as histograms, plus counters)
+# ============================================================
+# Stage timings are histograms in seconds; counters track rows, pages and
+# files. Pool workers record into their own copy and hand it back with
+# drain(), which the parent folds in with merge().
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_histograms = {}  # (name, labels) -> {"buckets": [count per bucket + overflow], "count": n, "sum": seconds}
+_counters = {}    # (name, labels) -> value
+
+def _reset_lock_after_fork():
+    # Pool workers are forked from a threaded server; another thread may have
+    # held _lock at the moment of the fork, and it would stay held forever in
+    # the child. Workers drain() before recording, so the copied values do not
+    # matter, only a usable lock.
+    global _lock
+    _lock = threading.Lock()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lock_after_fork)
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def _new_histogram():
+    return {"buckets": [0] * (len(HISTOGRAM_BUCKETS) + 1), "count": 0, "sum": 0.0}
+
+def observe(name, seconds, **labels):
+    """Record one duration for a histogram."""
+    with _lock:
+        histogram = _histograms.setdefault(_key(name, labels), _new_histogram())
+        histogram["buckets"][bisect_left(HISTOGRAM_BUCKETS, seconds)] += 1
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+
+def increment(name, amount=1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + amount
+
+@contextmanager
+def timed(name, **labels):
+    """Time the with-block into histogram `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def drain():
+    """Return everything recorded so far in this process and start again from zero."""
+    global _histograms, _counters
+    with _lock:
+        recorded = (_histograms, _counters)
+        _histograms, _counters = {}, {}
+    return recorded
+
+def merge(recorded):
+    """Add what drain() returned in another process."""
+    histograms, counters = recorded
+    with _lock:
+        for key, other in histograms.items():
+            histogram = _histograms.setdefault(key, _new_histogram())
+            histogram["buckets"] = [a + b for a, b in zip(histogram["buckets"], other["buckets"])]
+            histogram["count"] += other["count"]
+            histogram["sum"] += other["sum"]
+        for key, value in counters.items():
+            _counters[key] = _counters.get(key, 0) + value
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+def render_text():
+    """Prometheus text exposition of every histogram and counter."""
+    with _lock:
+        histograms = {key: dict(value, buckets=list(value["buckets"])) for key, value in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    typed = set()
+    for (name, labels), histogram in sorted(histograms.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} histogram")
+            typed.add(name)
+        cumulative = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS, histogram["buckets"]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram['count']}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    """The same data as render_text(), as a JSON-friendly dict."""
+    with _lock:
+        return {
+            "buckets": list(HISTOGRAM_BUCKETS),
+            "histograms": [
+                {"name": name, "labels": dict(labels), "buckets": list(h["buckets"]), "count": h["count"], "sum": h["sum"]}
+                for (name, labels), h in sorted(_histograms.items())
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(_counters.items())
+            ],
+        }
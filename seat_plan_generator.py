@@ -1,32 +1,82 @@
 import os
 import re
-import pdfplumber
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from bisect import bisect_right
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import pandas as pd
+from pandas.io.parsers import TextParser
 from datetime import datetime
-from dateutil import parser
 from fpdf import FPDF
+import metrics
 
 # ============================================================
-# GLOBAL VARIABLES (Overwritten by the web app)
+# GLOBAL VARIABLES (defaults for GenerationContext; the web app passes its own)
 # ============================================================
-PDF_INPUT_FOLDER = r"C:\Path\To\Default\PDFs"  # Will be replaced at runtime in app.py
+PDF_INPUT_FOLDER = r"C:\Path\To\Default\PDFs"  # Used by the command line; app.py passes per-user folders
 MERGED_EXCEL_PATH = os.path.join(os.getcwd(), "merged_excel.xlsx")
+# The generators load the merged roster from a pickle stored next to the xlsx;
+# the xlsx itself is only an export for people to open. The store also keeps
+# each roster file's rows so a merge only re-reads the PDFs that changed.
+MERGED_STORE_SCHEMA_VERSION = 3
+WRITE_MERGED_EXCEL = os.environ.get("WRITE_MERGED_EXCEL", "1") == "1"
+# Seat assignments are saved next to the merged roster and reused by every
+# generator while the roster and room info stay the same.
+SEATING_ALGORITHM_VERSION = "2"
 DEFAULT_ROOM_INFO_PATH = r"C:\Path\To\Default\room_info.xlsx"  # Fallback path
 OUTPUT_FOLDER = os.path.join(os.getcwd(), "output")
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Create dedicated subfolders for the different PDF types:
-SEAT_PLAN_OUTPUT_FOLDER = os.path.join(OUTPUT_FOLDER, "SeatPlan_PDFs")
-os.makedirs(SEAT_PLAN_OUTPUT_FOLDER, exist_ok=True)
-ATTENDANCE_OUTPUT_FOLDER = os.path.join(OUTPUT_FOLDER, "Attendance_Sheets")
-os.makedirs(ATTENDANCE_OUTPUT_FOLDER, exist_ok=True)
+# Number of worker processes used to extract roster PDFs during a merge.
+# 0 or 1 keeps the original one-file-at-a-time behaviour.
+PDF_INGEST_WORKERS = int(os.environ.get("PDF_INGEST_WORKERS", "0"))
+
+# Number of worker processes used to render seat plan and attendance PDFs.
+# 0 or 1 renders in the calling process.
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "0"))
+
+# Reuse the roster table's column layout from the first page instead of
+# running full table detection on every page (falls back automatically).
+PDF_FAST_EXTRACTION = os.environ.get("PDF_FAST_EXTRACTION", "1") == "1"
+
+# Extracted rows are plain lists in ROSTER_COLUMNS order (far smaller than a
+# dict per row). Rosters are read one page at a time and each page is closed
+# as soon as it is done; page.close() releasing pdfplumber's parsed objects
+# and layout caches is what keeps a long roster from growing in memory.
+ROSTER_COLUMNS = [
+    "Student ID", "Student Name", "M Batch", "Credits", "Program",
+    "Faculty ID", "Faculty Name", "Section", "Batch Number",
+    "Course Code", "Course Title"
+]
+
+# Persistent cache of extracted roster rows, keyed by PDF content hash.
+# Bump EXTRACTOR_VERSION whenever the extraction logic changes output.
+EXTRACTOR_VERSION = "5"
+EXTRACTION_CACHE_FOLDER = os.environ.get("EXTRACTION_CACHE_FOLDER", os.path.join(os.getcwd(), "cache", "extraction"))
+EXTRACTION_CACHE_MAX_BYTES = int(os.environ.get("EXTRACTION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 0 disables
+EXTRACTION_CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+
+# Content-addressed cache of rendered PDFs: a seat plan, attendance sheet,
+# summary or envelope file whose inputs (seats, roster rows, headers) are
+# unchanged is copied from here instead of being drawn again, so after a late
+# roster change only the affected rooms and groups are re-rendered.
+# Bump RENDER_CACHE_VERSION whenever a renderer's output changes.
+RENDER_CACHE_VERSION = "1"
+RENDER_CACHE_FOLDER = os.environ.get("RENDER_CACHE_FOLDER", os.path.join(os.getcwd(), "cache", "render"))
+RENDER_CACHE_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 0 disables
 
 # Persist the uploaded room info file’s path
 ROOM_INFO_PATH_FILENAME = os.path.join(OUTPUT_FOLDER, "room_info_path.txt")
 
-def get_room_info_path():
-    if os.path.exists(ROOM_INFO_PATH_FILENAME):
-        with open(ROOM_INFO_PATH_FILENAME, "r") as f:
+def get_room_info_path(path_file=None):
+    path_file = path_file or ROOM_INFO_PATH_FILENAME
+    if os.path.exists(path_file):
+        with open(path_file, "r") as f:
             path = f.read().strip()
         if os.path.exists(path):
             return path
@@ -76,16 +126,226 @@ def set_custom_envelopes_headers(line1, line2, line3, line4):
     CUSTOM_ENVELOPES_LINE3 = line3
     CUSTOM_ENVELOPES_LINE4 = line4
 
+# ============================================================
+# GENERATION CONTEXT (paths and headers for one run)
+# ============================================================
+class GenerationContext:
+    """Where one run reads and writes its files, plus its custom header lines.
+
+    Passed through merging, seating and rendering so requests from different
+    users can run side by side. Anything not given falls back to the module
+    globals above, which is what the command line uses.
+    """
+    def __init__(self, pdf_input_folder=None, merged_excel_path=None, output_folder=None, room_info_path_file=None):
+        self.pdf_input_folder = pdf_input_folder or PDF_INPUT_FOLDER
+        self.merged_excel_path = merged_excel_path or MERGED_EXCEL_PATH
+        self.output_folder = output_folder or OUTPUT_FOLDER
+        self.room_info_path_file = room_info_path_file or ROOM_INFO_PATH_FILENAME
+        self.seatplan_line1 = CUSTOM_SEATPLAN_LINE1
+        self.seatplan_line2 = CUSTOM_SEATPLAN_LINE2
+        self.attendance_line1 = CUSTOM_ATTENDANCE_LINE1
+        self.attendance_line2 = CUSTOM_ATTENDANCE_LINE2
+        self.attendance_program = CUSTOM_ATTENDANCE_PROGRAM
+        self.summary_line1 = CUSTOM_SUMMARY_LINE1
+        self.summary_line2 = CUSTOM_SUMMARY_LINE2
+        self.summary_line3 = CUSTOM_SUMMARY_LINE3
+        self.envelopes_line1 = CUSTOM_ENVELOPES_LINE1
+        self.envelopes_line2 = CUSTOM_ENVELOPES_LINE2
+        self.envelopes_line3 = CUSTOM_ENVELOPES_LINE3
+        self.envelopes_line4 = CUSTOM_ENVELOPES_LINE4
+        # Callbacks told about every finished output file, in the calling
+        # process (the web app uses this to report job progress).
+        self.output_listeners = []
+
+    def __getstate__(self):
+        # Render workers only need the paths and headers.
+        state = dict(self.__dict__)
+        state["output_listeners"] = []
+        return state
+
+    @property
+    def seat_plan_output_folder(self):
+        return os.path.join(self.output_folder, "SeatPlan_PDFs")
+
+    @property
+    def attendance_output_folder(self):
+        return os.path.join(self.output_folder, "Attendance_Sheets")
+
+    def make_output_folders(self):
+        os.makedirs(self.seat_plan_output_folder, exist_ok=True)
+        os.makedirs(self.attendance_output_folder, exist_ok=True)
+
+    def get_room_info_path(self):
+        return get_room_info_path(self.room_info_path_file)
+
+    def set_room_info_path(self, path):
+        os.makedirs(os.path.dirname(self.room_info_path_file), exist_ok=True)
+        with open(self.room_info_path_file, "w") as f:
+            f.write(path)
+
+    def set_seatplan_headers(self, line1, line2):
+        self.seatplan_line1 = line1
+        self.seatplan_line2 = line2
+
+    def set_attendance_headers(self, line1, line2):
+        self.attendance_line1 = line1
+        self.attendance_line2 = line2
+
+    def set_attendance_program(self, program):
+        self.attendance_program = program
+
+    def set_summary_headers(self, line1, line2, line3):
+        self.summary_line1 = line1
+        self.summary_line2 = line2
+        self.summary_line3 = line3
+
+    def set_envelopes_headers(self, line1, line2, line3, line4):
+        self.envelopes_line1 = line1
+        self.envelopes_line2 = line2
+        self.envelopes_line3 = line3
+        self.envelopes_line4 = line4
+
+    def notify_output(self, path):
+        if path:
+            metrics.increment("output_files_total")
+            for callback in list(self.output_listeners):
+                callback(path)
+
+# ============================================================
+# RENDER JOBS (one independent PDF per job, optionally on a process pool)
+# ============================================================
+# Each job's arguments include its GenerationContext, so pool workers get
+# the headers and folders for the run without touching module globals.
+def _run_render_job(job):
+    render_fn, args = job
+    with metrics.timed("render_seconds", renderer=render_fn.__name__):
+        return render_fn(*args)
+
+def _run_render_job_in_worker(job):
+    """Pool entry point: the output path plus the metrics recorded while rendering it."""
+    metrics.drain()  # drop anything inherited from the parent process
+    path = _run_render_job(job)
+    return path, metrics.drain()
+
+class BookmarkedPDF(FPDF):
+    """FPDF with a flat document outline, used for the single-file output mode.
+
+    All sheets share one document, so the logo image and core fonts are
+    embedded once and referenced from every page.
+    """
+    def __init__(self, *args, **kwargs):
+        FPDF.__init__(self, *args, **kwargs)
+        self.outlines = []
+        self.outline_root = None
+
+    def bookmark(self, title):
+        self.outlines.append((title, self.page, (self.h - self.get_y()) * self.k))
+
+    def _putbookmarks(self):
+        first = self.n + 1
+        count = len(self.outlines)
+        for i, (title, page, y) in enumerate(self.outlines):
+            self._newobj()
+            self._out('<</Title ' + self._textstring(title))
+            self._out('/Parent %d 0 R' % (first + count))
+            if i > 0:
+                self._out('/Prev %d 0 R' % (first + i - 1))
+            if i < count - 1:
+                self._out('/Next %d 0 R' % (first + i + 1))
+            # Page n is object 1 + 2n in FPDF 1.7 (each page is followed by its content stream).
+            self._out('/Dest [%d 0 R /XYZ 0 %.2f null]' % (1 + 2 * page, y))
+            self._out('/Count 0>>')
+            self._out('endobj')
+        self._newobj()
+        self.outline_root = self.n
+        self._out('<</Type /Outlines /First %d 0 R' % first)
+        self._out('/Last %d 0 R' % (first + count - 1))
+        self._out('/Count %d>>' % count)
+        self._out('endobj')
+
+    def _putresources(self):
+        FPDF._putresources(self)
+        if self.outlines:
+            self._putbookmarks()
+
+    def _putcatalog(self):
+        FPDF._putcatalog(self)
+        if self.outlines:
+            self._out('/Outlines %d 0 R' % self.outline_root)
+            self._out('/PageMode /UseOutlines')
+
+def render_jobs_to_single_pdf(jobs, pdf, output_path, ctx=None):
+    """Render every job as pages of one document instead of one file each."""
+    ctx = ctx or GenerationContext()
+    if not jobs:
+        return None
+    with metrics.timed("render_seconds", renderer="combined"):
+        for render_fn, args in jobs:
+            render_fn(*args, pdf=pdf)
+        pdf.output(output_path)
+    print(f"Combined PDF generated: {output_path}")
+    ctx.notify_output(output_path)
+    return output_path
+
+def run_render_jobs(jobs, workers=None, ctx=None):
+    """Render (function, args) jobs and return their output paths in job order."""
+    ctx = ctx or GenerationContext()
+    if workers is None:
+        workers = RENDER_WORKERS
+    workers = min(workers, len(jobs))
+    paths = []
+    if workers <= 1:
+        for job in jobs:
+            paths.append(_run_render_job(job))
+            ctx.notify_output(paths[-1])
+        evict_render_cache()
+        return paths
+    print(f"Rendering {len(jobs)} PDFs with {workers} worker processes...")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, recorded in executor.map(_run_render_job_in_worker, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+            metrics.merge(recorded)
+            paths.append(path)
+            ctx.notify_output(path)
+    evict_render_cache()
+    return paths
+
 # ============================================================
 # HELPER FUNCTIONS (wrapping, vertical centering, etc.)
 # ============================================================
-def wrap_long_word_with_hyphen(pdf, word, cell_width, indent="     "):
+# Text measurement uses the core fonts' per-glyph width tables (the same
+# numbers FPDF.get_string_width() sums), with bounded caches for both string
+# widths and wrap results. TTF/unicode fonts fall back to FPDF directly.
+TEXT_WIDTH_CACHE_SIZE = 65536
+WRAP_CACHE_SIZE = 8192
+_GLYPH_WIDTHS = {}  # core font name -> {char: width in 1/1000 em}
+
+def _core_font_key(pdf):
+    if pdf.unifontsubset:
+        return None
+    font_key = pdf.current_font['name']
+    if font_key not in _GLYPH_WIDTHS:
+        _GLYPH_WIDTHS[font_key] = pdf.current_font['cw']
+    return font_key
+
+@lru_cache(maxsize=TEXT_WIDTH_CACHE_SIZE)
+def _text_units(font_key, text):
+    cw = _GLYPH_WIDTHS[font_key]
+    return sum(cw.get(ch, 0) for ch in text)
+
+def string_width(pdf, text):
+    """Cached equivalent of pdf.get_string_width(text)."""
+    font_key = _core_font_key(pdf)
+    if font_key is None:
+        return pdf.get_string_width(text)
+    return _text_units(font_key, text) * pdf.font_size / 1000.0
+
+def _wrap_long_word_with_hyphen(width_of, word, cell_width, indent):
     parts = word.split('-')
     lines = []
     current_line = parts[0]
     for part in parts[1:]:
         candidate = current_line + '-' + part
-        if pdf.get_string_width(candidate) <= cell_width:
+        if width_of(candidate) <= cell_width:
             current_line = candidate
         else:
             lines.append(current_line + '-')
@@ -93,56 +353,81 @@ def wrap_long_word_with_hyphen(pdf, word, cell_width, indent="     "):
     lines.append(current_line)
     return lines
 
-def wrap_text(pdf, text, cell_width):
+def _wrap_chars(width_of, glyph_widths, font_size, word, cell_width, lines):
+    """Break a word with no hyphens character by character; returns the last partial line."""
+    char_line = ""
+    if glyph_widths is None:
+        for ch in word:
+            if width_of(char_line + ch) <= cell_width:
+                char_line += ch
+            else:
+                lines.append(char_line)
+                char_line = ch
+        return char_line
+    # Running sum of glyph widths instead of re-measuring every prefix.
+    char_units = 0
+    for ch in word:
+        ch_units = glyph_widths.get(ch, 0)
+        if (char_units + ch_units) * font_size / 1000.0 <= cell_width:
+            char_line += ch
+            char_units += ch_units
+        else:
+            lines.append(char_line)
+            char_line = ch
+            char_units = ch_units
+    return char_line
+
+def _wrap_text(width_of, glyph_widths, font_size, text, cell_width):
     indent = "     "
     words = text.split(' ')
     lines = []
     current_line = ""
     for word in words:
         candidate = word if current_line == "" else current_line + " " + word
-        if pdf.get_string_width(candidate) <= cell_width:
+        if width_of(candidate) <= cell_width:
             current_line = candidate
         else:
             if current_line:
                 lines.append(current_line)
                 current_line = ""
-                if pdf.get_string_width(word) <= cell_width:
+                if width_of(word) <= cell_width:
                     current_line = word
                 else:
                     if '-' in word:
-                        hyphen_lines = wrap_long_word_with_hyphen(pdf, word, cell_width, indent)
+                        hyphen_lines = _wrap_long_word_with_hyphen(width_of, word, cell_width, indent)
                         lines.extend(hyphen_lines[:-1])
                         current_line = hyphen_lines[-1]
                     else:
-                        char_line = ""
-                        for ch in word:
-                            if pdf.get_string_width(char_line + ch) <= cell_width:
-                                char_line += ch
-                            else:
-                                lines.append(char_line)
-                                char_line = ch
-                        current_line = char_line
+                        current_line = _wrap_chars(width_of, glyph_widths, font_size, word, cell_width, lines)
             else:
-                if pdf.get_string_width(word) <= cell_width:
+                if width_of(word) <= cell_width:
                     current_line = word
                 else:
                     if '-' in word:
-                        hyphen_lines = wrap_long_word_with_hyphen(pdf, word, cell_width, indent)
+                        hyphen_lines = _wrap_long_word_with_hyphen(width_of, word, cell_width, indent)
                         lines.extend(hyphen_lines)
                         current_line = ""
                     else:
-                        char_line = ""
-                        for ch in word:
-                            if pdf.get_string_width(char_line + ch) <= cell_width:
-                                char_line += ch
-                            else:
-                                lines.append(char_line)
-                                char_line = ch
-                        current_line = char_line
+                        current_line = _wrap_chars(width_of, glyph_widths, font_size, word, cell_width, lines)
     if current_line:
         lines.append(current_line)
     return "\n".join(lines)
 
+@lru_cache(maxsize=WRAP_CACHE_SIZE)
+def _wrap_text_cached(font_key, font_size, text, cell_width):
+    def width_of(candidate):
+        return _text_units(font_key, candidate) * font_size / 1000.0
+    return _wrap_text(width_of, _GLYPH_WIDTHS[font_key], font_size, text, cell_width)
+
+def wrap_long_word_with_hyphen(pdf, word, cell_width, indent="     "):
+    return _wrap_long_word_with_hyphen(lambda candidate: string_width(pdf, candidate), word, cell_width, indent)
+
+def wrap_text(pdf, text, cell_width):
+    font_key = _core_font_key(pdf)
+    if font_key is None:
+        return _wrap_text(pdf.get_string_width, None, pdf.font_size, text, cell_width)
+    return _wrap_text_cached(font_key, pdf.font_size, text, cell_width)
+
 def ensure_space(pdf, height_needed):
     if pdf.get_y() + height_needed > pdf.h - pdf.b_margin:
         pdf.add_page()
@@ -171,7 +456,7 @@ def vertical_centered_row(pdf, data, widths, line_height, alignments=None, cell_
         vertical_offset = (row_height - text_height) / 2
         y_current = y_start + vertical_offset
         for line in lines:
-            text_width = pdf.get_string_width(line)
+            text_width = string_width(pdf, line)
             if alignments[i] == "C":
                 x_text = x_current + cell_padding + ((cell_width - 2 * cell_padding) - text_width) / 2
             elif alignments[i] == "L":
@@ -186,12 +471,13 @@ def vertical_centered_row(pdf, data, widths, line_height, alignments=None, cell_
         x_current += cell_width
     pdf.set_xy(x_start, y_start + row_height)
 
-def print_top_info_table(pdf, group_info, metadata):
+def print_top_info_table(pdf, group_info, metadata, ctx=None):
+    ctx = ctx or GenerationContext()
     left_labels = ["Faculty ID", "Program", "Course Code", "Credits", "Exam Date"]
     right_labels = ["Faculty Name", "Batch Number", "Course Title", "Section", "Exam Time"]
     left_values = [
         group_info.get("Faculty ID", ""),
-        CUSTOM_ATTENDANCE_PROGRAM if CUSTOM_ATTENDANCE_PROGRAM else metadata.get("Program", ""),
+        ctx.attendance_program if ctx.attendance_program else metadata.get("Program", ""),
         group_info.get("Course Code", ""),
         group_info.get("Credits", ""),
         ""
@@ -213,114 +499,661 @@ def print_top_info_table(pdf, group_info, metadata):
 
 # ============================================================
 # PDF DATA EXTRACTION FUNCTIONS
-# (unchanged)
 # ============================================================
-def extract_program_from_lines(lines):
-    program_lines = []
-    capturing = False
-    for line in lines:
-        if "Program" in line:
-            capturing = True
-            after = line.split("Program", 1)[1].strip()
-            program_lines.append(after)
-        elif capturing:
-            if "Batch Number" in line:
-                part = line.split("Batch Number", 1)[0].strip()
-                if part:
-                    program_lines.append(part)
-                break
-            elif "Course Code" in line:
-                part = line.split("Course Code", 1)[0].strip()
-                if part:
-                    program_lines.append(part)
+# Roster header labels, found in one pass over the header text. Course Title
+# runs to "Credits"; Faculty Name is the rest of its line; the other fields
+# are single tokens, except Program (see program_value).
+HEADER_FIELDS = ["Program", "Faculty ID", "Faculty Name", "Batch Number",
+                 "Course Code", "Course Title", "Credits", "Section"]
+# The single-token labels match in any case ("Batch number 29"); Program,
+# Faculty Name and Course Title only as written, so upper-case values such
+# as "COURSE TITLE ..." are not mistaken for labels.
+_SINGLE_TOKEN_FIELDS = ("Faculty ID", "Batch Number", "Course Code", "Credits", "Section")
+HEADER_LABEL_RE = re.compile(
+    r"\b((?i:" + "|".join(re.escape(field) for field in _SINGLE_TOKEN_FIELDS) + r")|"
+    + "|".join(re.escape(field) for field in HEADER_FIELDS if field not in _SINGLE_TOKEN_FIELDS) + r")\b"
+)
+_HEADER_FIELD_NAMES = {field.lower(): field for field in HEADER_FIELDS}
+
+def program_value(text, label_start, label_end):
+    """The Program value around its label at text[label_start:label_end].
+
+    A long program name wraps inside its cell, and the text layer can put the
+    label between the wrapped lines with the next column's label after it:
+
+        BSc in Civil Engineering (For Diploma
+        Program Batch Number 29
+        Holder)
+
+    The value is what follows the label on its own line (up to the next
+    label) plus the unlabelled lines below it; when nothing follows the label,
+    the name was centred on it, so as many unlabelled lines directly above
+    as were found below are taken too.
+    """
+    lines = text.split("\n")
+    index = text.count("\n", 0, label_start)
+    line_end = text.find("\n", label_end)
+    rest = text[label_end:] if line_end < 0 else text[label_end:line_end]
+    next_label = HEADER_LABEL_RE.search(rest)
+    same_line = (rest[:next_label.start()] if next_label else rest).strip()
+    below = []
+    for line in lines[index + 1:]:
+        if HEADER_LABEL_RE.search(line):
+            break
+        below.append(line.strip())
+    above = []
+    if not same_line:
+        for line in reversed(lines[:index]):
+            if len(above) >= len(below) or HEADER_LABEL_RE.search(line):
                 break
-            else:
-                program_lines.append(line.strip())
-    return " ".join(program_lines).replace('"', '').strip()
+            above.insert(0, line.strip())
+    parts = above + [same_line] + below
+    return " ".join(part for part in parts if part).replace('"', '').strip()
 
-def extract_metadata_from_text(text):
+def parse_roster_header(text):
+    """Parse the header fields out of text; returns (metadata, names of fields not found)."""
+    labels = [(_HEADER_FIELD_NAMES[m.group(1).lower()], m.start(), m.end()) for m in HEADER_LABEL_RE.finditer(text)]
+    values = {}
+    for field, label_start, value_start in labels:
+        if field in values:
+            continue  # the first occurrence wins
+        if field == "Program":
+            values[field] = program_value(text, label_start, value_start)
+        elif field == "Course Title":
+            value_end = next((start for name, start, _ in labels
+                              if name == "Credits" and start >= value_start), len(text))
+            values[field] = text[value_start:value_end]
+        else:
+            values[field] = text[value_start:]
     metadata = {}
-    lines = text.split("\n")
-    metadata["Program"] = extract_program_from_lines(lines)
-    faculty_match = re.search(r'Faculty ID\s+(\S+)\s+Faculty Name\s+([^\n]+)', text, re.IGNORECASE)
-    if faculty_match:
-        metadata["Faculty ID"] = faculty_match.group(1).strip()
-        metadata["Faculty Name"] = faculty_match.group(2).strip()
-    else:
-        metadata["Faculty ID"] = ""
-        metadata["Faculty Name"] = ""
-    batch_match = re.search(r'Batch Number\s+(\S+)', text, re.IGNORECASE)
-    metadata["Batch Number"] = batch_match.group(1).strip() if batch_match else ""
-    course_code_match = re.search(r'Course Code\s+(\S+)', text, re.IGNORECASE)
-    metadata["Course Code"] = course_code_match.group(1).strip() if course_code_match else ""
-    course_title_match = re.search(r'Course Title\s+([\s\S]+?)\s+Credits', text, re.IGNORECASE)
-    metadata["Course Title"] = course_title_match.group(1).replace("\n", " ").strip() if course_title_match else ""
-    credits_match = re.search(r'Credits\s+(\S+)', text, re.IGNORECASE)
-    metadata["Credits"] = credits_match.group(1).strip() if credits_match else ""
-    section_match = re.search(r'Section\s+(\S+)', text, re.IGNORECASE)
-    metadata["Section"] = section_match.group(1).strip() if section_match else ""
-    return metadata
-
-def extract_data_from_pdf(pdf_path):
+    for field in HEADER_FIELDS:
+        value = values.get(field, "")
+        if field in _SINGLE_TOKEN_FIELDS:
+            tokens = value.split(None, 1)
+            value = tokens[0] if tokens else ""
+        elif field == "Faculty Name":
+            value = value.strip().split("\n")[0].strip()
+        else:
+            value = value.replace("\n", " ").strip()
+        metadata[field] = value
+    return metadata, [field for field in HEADER_FIELDS if not metadata[field]]
+
+def extract_metadata_from_text(text):
+    return parse_roster_header(text)[0]
+
+def roster_header_text(page):
+    """Text above the page's first ruling line, i.e. above the roster table; None if there is none."""
+    tops = [obj["top"] for obj in page.lines] + [obj["top"] for obj in page.rects]
+    top = min(tops, default=None)
+    if top is None or top <= page.bbox[1]:
+        return None
+    return page.crop((page.bbox[0], page.bbox[1], page.bbox[2], top)).extract_text()
+
+def extract_roster_metadata(page):
+    """Header fields from a roster's first page; returns (metadata, names of fields not found).
+
+    Only the header region is read. If that misses a field (no ruling lines,
+    or a header drawn inside boxes) the full page text is parsed instead. An
+    empty Program alone does not count: some rosters legitimately have none.
+    """
+    header = roster_header_text(page)
+    if header is not None:
+        metadata, missing = parse_roster_header(header)
+        if missing in ([], ["Program"]):
+            return metadata, missing
+    return parse_roster_header(page.extract_text() or "")
+
+# ============================================================
+# EXTRACTION CACHE (content hash -> extracted rows, LRU by mtime)
+# ============================================================
+def extraction_cache_key(pdf_path):
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f"{digest.hexdigest()}-v{EXTRACTOR_VERSION}"
+
+def load_cached_extraction(key):
+    if EXTRACTION_CACHE_MAX_BYTES <= 0:
+        return None
+    cache_path = os.path.join(EXTRACTION_CACHE_FOLDER, key + ".json")
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            rows = json.load(f)
+    except (OSError, ValueError):
+        EXTRACTION_CACHE_STATS["misses"] += 1
+        return None
+    os.utime(cache_path)  # mark as recently used
+    EXTRACTION_CACHE_STATS["hits"] += 1
+    metrics.increment("extraction_cache_hits_total")
+    return rows
+
+def unique_tmp_path(path):
+    """A temporary name next to path that no other thread or process will pick."""
+    return f"{path}.{uuid.uuid4().hex}.tmp"
+
+def store_cached_extraction(key, rows):
+    if EXTRACTION_CACHE_MAX_BYTES <= 0:
+        return
+    os.makedirs(EXTRACTION_CACHE_FOLDER, exist_ok=True)
+    cache_path = os.path.join(EXTRACTION_CACHE_FOLDER, key + ".json")
+    tmp_path = unique_tmp_path(cache_path)
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f)
+    os.replace(tmp_path, cache_path)
+    evict_extraction_cache()
+
+def evict_extraction_cache():
+    EXTRACTION_CACHE_STATS["evictions"] += evict_cache_folder(EXTRACTION_CACHE_FOLDER, ".json", EXTRACTION_CACHE_MAX_BYTES)
+
+def evict_cache_folder(folder, suffix, max_bytes):
+    """Delete least recently used files until the folder fits in max_bytes; returns how many went."""
+    entries = []
+    total = 0
+    evicted = 0
+    if not os.path.isdir(folder):
+        return 0
+    for name in os.listdir(folder):
+        if not name.endswith(suffix):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+        total += st.st_size
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        evicted += 1
+    return evicted
+
+# ============================================================
+# RENDER CACHE (rendered inputs hash -> PDF, LRU by mtime)
+# ============================================================
+def render_cache_key(kind, *inputs):
+    """Hash everything a rendered PDF depends on (None if the inputs cannot be serialized)."""
+    try:
+        payload = json.dumps([kind, RENDER_CACHE_VERSION, inputs], sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def restore_cached_render(key, output_path):
+    """Put the cached PDF for key at output_path; False if there is none."""
+    if key is None or RENDER_CACHE_MAX_BYTES <= 0:
+        return False
+    cache_path = os.path.join(RENDER_CACHE_FOLDER, key + ".pdf")
+    try:
+        # A copy, not a hard link: the output file is rewritten in place later
+        # and must not share its inode with the cache entry.
+        shutil.copyfile(cache_path, output_path)
+        os.utime(cache_path)  # mark as recently used
+    except OSError:
+        return False
+    metrics.increment("render_cache_hits_total")
+    return True
+
+def store_cached_render(key, output_path):
+    if key is None or RENDER_CACHE_MAX_BYTES <= 0:
+        return
+    os.makedirs(RENDER_CACHE_FOLDER, exist_ok=True)
+    cache_path = os.path.join(RENDER_CACHE_FOLDER, key + ".pdf")
+    tmp_path = unique_tmp_path(cache_path)
+    shutil.copyfile(output_path, tmp_path)
+    os.replace(tmp_path, cache_path)
+
+def evict_render_cache():
+    if RENDER_CACHE_MAX_BYTES > 0:
+        evict_cache_folder(RENDER_CACHE_FOLDER, ".pdf", RENDER_CACHE_MAX_BYTES)
+
+def extract_data_from_pdf(pdf_path, use_cache=True):
+    use_cache = use_cache and EXTRACTION_CACHE_MAX_BYTES > 0
+    if use_cache:
+        key = extraction_cache_key(pdf_path)
+        rows = load_cached_extraction(key)
+        if rows is not None:
+            print(f"Using cached rows for {os.path.basename(pdf_path)}")
+            return rows
+    rows = extract_data_from_pdf_uncached(pdf_path)
+    if use_cache:
+        store_cached_extraction(key, rows)
+    return rows
+
+def roster_rows_from_tables(tables):
+    rows = []
+    for table in tables:
+        for row in table:
+            if row and row[0] and row[0].strip().isdigit():
+                rows.append(row)
+    return rows
+
+def detect_roster_columns(tables):
+    """Return the x positions of the roster table's column edges, or None."""
+    for table in sorted(tables, key=lambda t: len(t.rows), reverse=True):
+        for row in table.rows:
+            cells = row.cells
+            if len(cells) >= 4 and all(cell is not None for cell in cells):
+                return [cells[0][0]] + [cell[2] for cell in cells]
+    return None
+
+def words_to_cell_text(words, tolerance=3):
+    lines = []
+    for word in sorted(words, key=lambda w: (w["top"], w["x0"])):
+        if lines and abs(word["top"] - lines[-1][0]["top"]) <= tolerance:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return "\n".join(" ".join(w["text"] for w in sorted(line, key=lambda w: w["x0"])) for line in lines)
+
+def extract_rows_with_columns(page, col_edges, tolerance=3):
+    """Rebuild table rows from words using known column edges and the page's ruling lines.
+
+    Returns None when the page has no usable ruling lines for the table.
+    """
+    x0, x1 = col_edges[0], col_edges[-1]
+    bands = []
+    # Ruling positions straight from lines/rects; page.horizontal_edges would
+    # build four edge dicts per rect, which costs more than it saves.
+    rulings = [obj["top"] for obj in page.lines
+               if obj["x0"] < x1 and obj["x1"] > x0 and abs(obj["bottom"] - obj["top"]) <= tolerance]
+    for obj in page.rects:
+        if obj["x0"] < x1 and obj["x1"] > x0:
+            rulings.append(obj["top"])
+            rulings.append(obj["bottom"])
+    for top in sorted(rulings):
+        if not bands or top - bands[-1] > tolerance:
+            bands.append(top)
+    if len(bands) < 2:
+        return None
+    region = page.crop((max(x0, page.bbox[0]), max(bands[0], page.bbox[1]),
+                        min(x1, page.bbox[2]), min(bands[-1], page.bbox[3])))
+    ncols = len(col_edges) - 1
+    cells = {}
+    for word in region.extract_words():
+        r = bisect_right(bands, (word["top"] + word["bottom"]) / 2) - 1
+        c = bisect_right(col_edges, (word["x0"] + word["x1"]) / 2) - 1
+        if 0 <= r < len(bands) - 1 and 0 <= c < ncols:
+            cells.setdefault((r, c), []).append(word)
+    return [[words_to_cell_text(cells.get((r, c), [])) for c in range(ncols)] for r in range(len(bands) - 1)]
+
+def iter_page_rows(pdf):
+    """Yield each page's roster rows in page order, releasing every page once it is read.
+
+    The fast path reuses the first page's column layout for later pages. The
+    first page is checked against full table detection; if they disagree the
+    whole file goes through the original extract_tables() path, and any later
+    page without usable ruling lines falls back on its own.
+    """
+    fast = PDF_FAST_EXTRACTION
+    col_edges = None
+    for page_number, page in enumerate(pdf.pages):
+        try:
+            if page_number == 0 and fast:
+                first_tables = page.find_tables()
+                page_rows = roster_rows_from_tables(t.extract() for t in first_tables)
+                col_edges = detect_roster_columns(first_tables)
+                fast_first = extract_rows_with_columns(page, col_edges) if col_edges else None
+                if fast_first is None or [r[:4] for r in roster_rows_from_tables([fast_first])] != [r[:4] for r in page_rows]:
+                    print("Roster layout check failed; using full table detection.")
+                    fast = False
+            elif fast:
+                rows = extract_rows_with_columns(page, col_edges)
+                page_rows = roster_rows_from_tables([rows]) if rows is not None else None
+                if page_rows is None or any(not row[1] for row in page_rows):
+                    page_rows = roster_rows_from_tables(page.extract_tables())
+            else:
+                page_rows = roster_rows_from_tables(page.extract_tables())
+        finally:
+            page.close()  # drops the page's parsed objects and layout caches
+        yield page_rows
+
+def roster_row(table_row, metadata):
+    """One extracted row as a list in ROSTER_COLUMNS order."""
+    return [
+        table_row[1].strip() if table_row[1] else "",
+        table_row[2].strip() if table_row[2] else "",
+        table_row[3].strip() if table_row[3] else "",
+        metadata.get("Credits", ""),
+        metadata.get("Program", ""),
+        metadata.get("Faculty ID", ""),
+        metadata.get("Faculty Name", ""),
+        metadata.get("Section", ""),
+        metadata.get("Batch Number", ""),
+        metadata.get("Course Code", ""),
+        metadata.get("Course Title", ""),
+    ]
+
+@metrics.timed("pdf_extract_seconds")
+def extract_data_from_pdf_uncached(pdf_path):
+    import pdfplumber  # only extraction needs it; rendering processes never load it
+    rows = []
     with pdfplumber.open(pdf_path) as pdf:
-        first_page = pdf.pages[0]
-        full_text = first_page.extract_text()
         print(f"Processing {os.path.basename(pdf_path)}...")
-        metadata = extract_metadata_from_text(full_text)
-        table_data = []
-        for page in pdf.pages:
-            tables = page.extract_tables()
-            for table in tables:
-                for row in table:
-                    if row and row[0] and row[0].strip().isdigit():
-                        table_data.append(row)
-        extracted_data = []
-        for row in table_data:
-            extracted_data.append({
-                "Student ID": row[1].strip() if row[1] else "",
-                "Student Name": row[2].strip() if row[2] else "",
-                "M Batch": row[3].strip() if row[3] else "",
-                "Credits": metadata.get("Credits", ""),
-                "Program": metadata.get("Program", ""),
-                "Faculty ID": metadata.get("Faculty ID", ""),
-                "Faculty Name": metadata.get("Faculty Name", ""),
-                "Section": metadata.get("Section", ""),
-                "Batch Number": metadata.get("Batch Number", ""),
-                "Course Code": metadata.get("Course Code", ""),
-                "Course Title": metadata.get("Course Title", "")
-            })
-        return extracted_data
+        metadata, missing = extract_roster_metadata(pdf.pages[0])
+        if missing:
+            print(f"Header fields not found in {os.path.basename(pdf_path)}: {', '.join(missing)}")
+            metrics.increment("header_fields_missing_total", len(missing))
+        for page_rows in iter_page_rows(pdf):
+            rows.extend(roster_row(table_row, metadata) for table_row in page_rows)
+        metrics.increment("pdf_files_extracted_total")
+        metrics.increment("pdf_pages_extracted_total", len(pdf.pages))
+        metrics.increment("roster_rows_extracted_total", len(rows))
+    return rows
+
+def extract_data_from_pdf_safe(pdf_path, use_cache=True):
+    """Return (rows, error) so one unreadable roster does not abort a merge."""
+    try:
+        return extract_data_from_pdf(pdf_path, use_cache), None
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}"
+
+def _extract_in_worker(pdf_path):
+    """Pool entry point: (rows, error) plus the metrics recorded while extracting."""
+    metrics.drain()  # drop anything inherited from the parent process
+    rows, error = extract_data_from_pdf_safe(pdf_path, use_cache=False)
+    return rows, error, metrics.drain()
+
+def _extract_isolated(pdf_path):
+    """Extract one PDF in a pool of its own, so a worker that dies only fails this file."""
+    try:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return executor.submit(_extract_in_worker, pdf_path).result()
+    except BrokenProcessPool as e:
+        return [], f"Worker process died while reading this file ({e})", ({}, {})
+
+def extract_all_pdfs(pdf_paths, workers=None):
+    """Extract every roster, in the given order, serially or on a process pool.
+
+    Returns a list of (pdf_path, rows, error) tuples in the same order as
+    pdf_paths, so the merged output is identical whichever path is taken.
+    If a pool worker dies (out of memory, crash in a PDF library), the files
+    it had not finished are retried one per process and only the one that
+    kills its process is reported as failed.
+    """
+    if workers is None:
+        workers = PDF_INGEST_WORKERS
+    workers = min(workers, len(pdf_paths))
+    if workers <= 1:
+        results = [extract_data_from_pdf_safe(p) for p in pdf_paths]
+        return [(p, rows, error) for p, (rows, error) in zip(pdf_paths, results)]
+    # Cache lookups happen here so hit/miss counts stay in this process;
+    # the pool only sees the files that actually need parsing.
+    results = {}
+    pending = []
+    for p in pdf_paths:
+        if EXTRACTION_CACHE_MAX_BYTES <= 0:
+            pending.append((p, None))
+            continue
+        try:
+            key = extraction_cache_key(p)
+        except OSError as e:
+            results[p] = ([], f"{type(e).__name__}: {e}")
+            continue
+        rows = load_cached_extraction(key)
+        if rows is not None:
+            results[p] = (rows, None)
+        else:
+            pending.append((p, key))
+
+    def finish(p, key, extracted):
+        rows, error, recorded = extracted
+        metrics.merge(recorded)
+        if error is None and key is not None:
+            store_cached_extraction(key, rows)
+        results[p] = (rows, error)
+
+    if pending:
+        print(f"Extracting {len(pending)} PDFs with {workers} worker processes...")
+        try:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+                paths = [p for p, _ in pending]
+                for (p, key), extracted in zip(pending, executor.map(_extract_in_worker, paths)):
+                    finish(p, key, extracted)
+        except BrokenProcessPool as e:
+            unfinished = [(p, key) for p, key in pending if p not in results]
+            print(f"An extraction worker died ({e}); retrying {len(unfinished)} PDF(s) one at a time.")
+            metrics.increment("extraction_pool_failures_total")
+            for p, key in unfinished:
+                finish(p, key, _extract_isolated(p))
+    return [(p,) + results[p] for p in pdf_paths]
 
-def merge_pdf_data_to_excel():
-    columns = [
-        "Student ID", "Student Name", "M Batch", "Credits", "Program",
-        "Faculty ID", "Faculty Name", "Section", "Batch Number",
-        "Course Code", "Course Title"
+def roster_file_state(pdf_path):
+    st = os.stat(pdf_path)
+    return [st.st_size, st.st_mtime_ns]
+
+@metrics.timed("merge_seconds")
+def merge_pdf_data_to_excel(workers=None, ctx=None):
+    """Merge all roster PDFs in ctx.pdf_input_folder into ctx.merged_excel_path.
+
+    Rows for files that are unchanged since the last merge (same size and
+    mtime, or same content hash) and were read by the current
+    EXTRACTOR_VERSION come from the merged store, so only added or replaced
+    PDFs are read; removed files simply drop out.
+
+    Returns a list of (file name, error message) for rosters that could not
+    be read; those files are skipped and the rest of the merge goes ahead.
+    """
+    ctx = ctx or GenerationContext()
+    pdf_paths = [
+        os.path.join(ctx.pdf_input_folder, file_name)
+        for file_name in os.listdir(ctx.pdf_input_folder)
+        if file_name.lower().endswith(".pdf")
     ]
-    all_data = []
-    for file_name in os.listdir(PDF_INPUT_FOLDER):
-        if file_name.lower().endswith(".pdf"):
-            pdf_path = os.path.join(PDF_INPUT_FOLDER, file_name)
-            data = extract_data_from_pdf(pdf_path)
-            all_data.extend(data)
-    df = pd.DataFrame(all_data, columns=columns)
+    previous = load_stored_rosters(ctx)
+    rosters = {}
+    pending = []
+    for pdf_path in pdf_paths:
+        name = os.path.basename(pdf_path)
+        entry = previous.get(name)
+        if entry is not None and not entry["key"].endswith(f"-v{EXTRACTOR_VERSION}"):
+            entry = None  # read by an older extractor; its rows may be out of date
+        try:
+            state = roster_file_state(pdf_path)
+            key = None
+            if entry is not None and entry["state"] != state:
+                key = extraction_cache_key(pdf_path)
+                entry = dict(entry, state=state) if entry["key"] == key else None
+        except OSError:
+            entry, state, key = None, None, None
+        if entry is not None:
+            rosters[name] = entry
+        else:
+            pending.append((pdf_path, state, key))
+    current_names = {os.path.basename(p) for p in pdf_paths}
+    removed = [name for name in previous if name not in current_names]
+    print(f"Rosters: {len(rosters)} unchanged, {len(pending)} to read, {len(removed)} removed")
+    if not pending and not removed and previous and merged_store_is_current(ctx):
+        print("Merged roster is already up to date.")
+        return []
+    failures = []
+    extracted = extract_all_pdfs([p for p, _, _ in pending], workers)
+    for (pdf_path, state, key), (_, data, error) in zip(pending, extracted):
+        if error:
+            print(f"Error processing {os.path.basename(pdf_path)}: {error}")
+            failures.append((os.path.basename(pdf_path), error))
+            continue
+        rosters[os.path.basename(pdf_path)] = {
+            "state": state,
+            "key": key or extraction_cache_key(pdf_path),
+            "rows": data,
+        }
+    # Rows go in directory order, exactly as a from-scratch merge would see them,
+    # so drop_duplicates keeps the same first occurrence. The frame is built
+    # one roster at a time rather than from one list of every row.
+    frames = []
+    for pdf_path in pdf_paths:
+        entry = rosters.get(os.path.basename(pdf_path))
+        if entry is not None and entry["rows"]:
+            frames.append(pd.DataFrame(entry["rows"], columns=ROSTER_COLUMNS))
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ROSTER_COLUMNS)
     df = df.drop_duplicates(subset=["Student ID"])
     df["MID"] = df["Student ID"].astype(str).str[4:6].astype(int, errors="ignore")
     df["M Batch"] = pd.to_numeric(df["M Batch"], errors="coerce")
     df.sort_values(by=["Batch Number", "M Batch", "MID"], ascending=[True, False, False], inplace=True)
     df.drop(columns=["MID"], inplace=True)
-    df.to_excel(MERGED_EXCEL_PATH, index=False)
-    print(f"✅ Merged Excel file saved at: {MERGED_EXCEL_PATH}")
+    if WRITE_MERGED_EXCEL:
+        os.makedirs(os.path.dirname(ctx.merged_excel_path), exist_ok=True)
+        with metrics.timed("excel_write_seconds", file="merged"):
+            df.to_excel(ctx.merged_excel_path, index=False)
+        print(f"✅ Merged Excel file saved at: {ctx.merged_excel_path}")
+    # Written after the xlsx so load_merged_students() sees the store as current.
+    save_merged_students(df, ctx, rosters)
+    metrics.increment("merged_rows_total", len(df))
+    print("Extraction cache: {hits} hits, {misses} misses, {evictions} evictions".format(**EXTRACTION_CACHE_STATS))
+    return failures
+
+# ============================================================
+# MERGED ROSTER STORE
+# ============================================================
+def get_merged_store_path(ctx=None):
+    ctx = ctx or GenerationContext()
+    return os.path.splitext(ctx.merged_excel_path)[0] + ".pkl"
+
+def _excel_cell_value(value):
+    # What openpyxl hands back for a cell pandas wrote: blanks become "",
+    # whole floats come back as ints.
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def excel_typed_frame(df):
+    """Give df the dtypes a to_excel/read_excel round trip would, without openpyxl.
+
+    The generators were written against frames read back from the xlsx
+    (numeric IDs, NaN for blanks), so the store keeps exactly that typing.
+    """
+    data = [list(df.columns)]
+    data.extend([_excel_cell_value(v) for v in row] for row in df.itertuples(index=False, name=None))
+    return TextParser(data, header=0, skip_blank_lines=False).read()
+
+def save_merged_students(df, ctx=None, rosters=None):
+    """Save the merged roster, plus each roster file's rows ({file name: {"state", "key", "rows"}})."""
+    store_path = get_merged_store_path(ctx)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    tmp_path = unique_tmp_path(store_path)
+    with metrics.timed("store_write_seconds", file="merged"):
+        pd.to_pickle({"schema_version": MERGED_STORE_SCHEMA_VERSION, "frame": excel_typed_frame(df),
+                      "rosters": rosters or {}}, tmp_path)
+    os.replace(tmp_path, store_path)
+    print(f"Merged roster store saved at: {store_path}")
+
+def merged_store_is_current(ctx=None):
+    """True if the store exists and the xlsx export has not been edited since it was saved."""
+    ctx = ctx or GenerationContext()
+    store_path = get_merged_store_path(ctx)
+    excel_path = ctx.merged_excel_path
+    return os.path.exists(store_path) and not (
+        os.path.exists(excel_path) and os.path.getmtime(excel_path) > os.path.getmtime(store_path))
+
+def load_stored_rosters(ctx=None):
+    """Per-file rows saved by the last merge, or {} if there is no usable store."""
+    store_path = get_merged_store_path(ctx)
+    if not os.path.exists(store_path):
+        return {}
+    try:
+        stored = pd.read_pickle(store_path)
+    except Exception as e:
+        print(f"Error loading merged roster store: {e}; re-reading every roster.")
+        return {}
+    if stored.get("schema_version") != MERGED_STORE_SCHEMA_VERSION:
+        return {}
+    return stored.get("rosters", {})
+
+def load_merged_students(ctx=None):
+    """Load the merged roster, preferring the pickle store over the xlsx.
+
+    Falls back to the xlsx when the store is missing, from another schema
+    version, or older than the xlsx (e.g. someone edited the export by hand).
+    """
+    ctx = ctx or GenerationContext()
+    store_path = get_merged_store_path(ctx)
+    if merged_store_is_current(ctx):
+        try:
+            with metrics.timed("store_read_seconds", file="merged"):
+                stored = pd.read_pickle(store_path)
+            if stored.get("schema_version") == MERGED_STORE_SCHEMA_VERSION:
+                return stored["frame"].copy()
+            print(f"Merged roster store at {store_path} has an old schema; reading the Excel file instead.")
+        except Exception as e:
+            print(f"Error loading merged roster store: {e}; reading the Excel file instead.")
+    with metrics.timed("excel_read_seconds", file="merged"):
+        return pd.read_excel(ctx.merged_excel_path)
+
+def load_room_info(ctx=None):
+    ctx = ctx or GenerationContext()
+    with metrics.timed("excel_read_seconds", file="room_info"):
+        return pd.read_excel(ctx.get_room_info_path())
 
 # ============================================================
 # SEAT ASSIGNMENT FUNCTIONS
 # ============================================================
-def is_blocked_seat(room, row, column):
-    blocked_seats = {
-        'A002': [(1, 1), (1, 5), (6, 1), (6, 5)],
-        'A008': [(1, 1), (1, 5), (6, 1), (6, 5)]
-    }
-    return (room in blocked_seats) and ((row, column) in blocked_seats[room])
+# Used for rooms when room_info has no "Blocked Seats" column.
+DEFAULT_BLOCKED_SEATS = {
+    'A002': frozenset({(1, 1), (1, 5), (6, 1), (6, 5)}),
+    'A008': frozenset({(1, 1), (1, 5), (6, 1), (6, 5)})
+}
+BLOCKED_SEATS_COLUMN = "Blocked Seats"
+
+def parse_blocked_seats(value):
+    """Parse a room_info cell such as "1,1; 1,5; 6-1; 6:5" into {(row, col), ...}."""
+    if value is None or (isinstance(value, float) and value != value):
+        return frozenset()
+    return frozenset((int(r), int(c)) for r, c in re.findall(r'(\d+)\s*[,:\-xX]\s*(\d+)', str(value)))
+
+def build_room_index(df_rooms):
+    """Build one record per room (rows, cols, blocked seats) for a whole run.
+
+    Keys are the room names as strings, matching df_rooms['Room'].astype(str).
+    If room_info has a "Blocked Seats" column it defines each room's blocked
+    seats; otherwise DEFAULT_BLOCKED_SEATS is used.
+    """
+    has_blocked_column = BLOCKED_SEATS_COLUMN in df_rooms.columns
+    rooms = {}
+    for record in df_rooms.to_dict("records"):
+        room = str(record['Room'])
+        if room in rooms:
+            continue
+        rows, cols = int(record['Row']), int(record['Column'])
+        if has_blocked_column:
+            blocked = parse_blocked_seats(record[BLOCKED_SEATS_COLUMN])
+        else:
+            blocked = DEFAULT_BLOCKED_SEATS.get(room, frozenset())
+        rooms[room] = {
+            "Room": room,
+            "Row": rows,
+            "Column": cols,
+            "blocked": blocked,
+        }
+    return rooms
+
+def take_students(batch_queue, count):
+    """Pop up to count student IDs off the front of a batch queue."""
+    return [batch_queue.popleft() for _ in range(min(count, len(batch_queue)))]
+
+def new_seat_index():
+    """Per-room lookup tables the seat plan renderer reads instead of scanning seats."""
+    return {"grid": {}, "batches_by_column": {}, "students_by_batch": {}}
+
+def add_seat_to_index(seat_index, seat):
+    seat_index["grid"].setdefault((seat['Row'], seat['Column']), seat)
+    seat_index["batches_by_column"].setdefault(seat['Column'], set()).add(seat['Batch'])
+    seat_index["students_by_batch"].setdefault(seat['Batch'], []).append(seat['Student ID'])
+
+def build_seat_index(seat_assignments):
+    seat_index = new_seat_index()
+    for seat in seat_assignments:
+        add_seat_to_index(seat_index, seat)
+    return seat_index
 
 def get_primary_secondary_columns(num_cols):
     col_indices = list(range(num_cols))
@@ -330,23 +1163,23 @@ def get_primary_secondary_columns(num_cols):
     secondary_cols = [x + 1 for x in secondary_0based]
     return primary_cols, secondary_cols
 
-def try_seat_two_batches_in_room(room, df_rooms, batch_students, seat_assignments):
-    if room not in df_rooms['Room'].values:
+def try_seat_two_batches_in_room(room, rooms, batch_students, seat_assignments, seat_indexes=None):
+    room_data = rooms.get(room)
+    if room_data is None:
         print(f"Warning: Room {room} not found in room data. Skipping this room.")
         return False
-    room_data = df_rooms[df_rooms['Room'] == room].iloc[0]
-    rows, cols = room_data['Row'], room_data['Column']
+    rows, cols, blocked = room_data['Row'], room_data['Column'], room_data['blocked']
     primary_cols, secondary_cols = get_primary_secondary_columns(cols)
     available_primary_seats = []
     for col in primary_cols:
         for r in range(1, rows + 1):
-            if not is_blocked_seat(room, r, col):
+            if (r, col) not in blocked:
                 available_primary_seats.append((r, col))
     primary_capacity = len(available_primary_seats)
     available_secondary_seats = []
     for col in secondary_cols:
         for r in range(1, rows + 1):
-            if not is_blocked_seat(room, r, col):
+            if (r, col) not in blocked:
                 available_secondary_seats.append((r, col))
     secondary_capacity = len(available_secondary_seats)
     sorted_batches = sorted(batch_students.keys(), key=lambda b: len(batch_students[b]), reverse=True)
@@ -366,40 +1199,47 @@ def try_seat_two_batches_in_room(room, df_rooms, batch_students, seat_assignment
             break
     if secondary_batch is None:
         return False
-    primary_students = batch_students[primary_batch][:primary_capacity]
-    secondary_students = batch_students[secondary_batch][:secondary_capacity]
-    batch_students[primary_batch] = batch_students[primary_batch][primary_capacity:]
-    batch_students[secondary_batch] = batch_students[secondary_batch][secondary_capacity:]
+    primary_students = take_students(batch_students[primary_batch], primary_capacity)
+    secondary_students = take_students(batch_students[secondary_batch], secondary_capacity)
+    room_index = seat_indexes.setdefault(room, new_seat_index()) if seat_indexes is not None else None
     for i, (r, col) in enumerate(available_primary_seats):
-        seat_assignments.append({
+        seat = {
             'Room': room,
             'Row': r,
             'Column': col,
             'Student ID': primary_students[i],
             'Batch': primary_batch
-        })
+        }
+        seat_assignments.append(seat)
+        if room_index is not None:
+            add_seat_to_index(room_index, seat)
     for i, (r, col) in enumerate(available_secondary_seats):
-        seat_assignments.append({
+        seat = {
             'Room': room,
             'Row': r,
             'Column': col,
             'Student ID': secondary_students[i],
             'Batch': secondary_batch
-        })
+        }
+        seat_assignments.append(seat)
+        if room_index is not None:
+            add_seat_to_index(room_index, seat)
     return True
 
-def seat_leftover_in_room_min_batches(room, df_rooms, batch_students, seat_assignments):
-    if room not in df_rooms['Room'].values:
+def seat_leftover_in_room_min_batches(room, rooms, batch_students, seat_assignments, seat_indexes=None):
+    room_data = rooms.get(room)
+    if room_data is None:
         print(f"Warning: Room {room} not found in room data. Skipping this room.")
         return
-    room_data = df_rooms[df_rooms['Room'] == room].iloc[0]
-    rows, cols = room_data['Row'], room_data['Column']
+    rows, cols, blocked = room_data['Row'], room_data['Column'], room_data['blocked']
     col_order = list(range(cols, 0, -1))
     sorted_batches = sorted(batch_students.keys(), key=lambda b: len(batch_students[b]), reverse=True)
     column_assignments = []
     prev_batch_per_row = {}
     for col in col_order:
         for r in range(1, rows + 1):
+            if (r, col) in blocked:
+                continue
             chosen_batch = None
             for b in sorted_batches:
                 if len(batch_students[b]) > 0 and prev_batch_per_row.get(r) != b:
@@ -409,7 +1249,7 @@ def seat_leftover_in_room_min_batches(room, df_rooms, batch_students, seat_assig
                 chosen_batch = next((b for b in sorted_batches if len(batch_students[b]) > 0), None)
             if chosen_batch is None:
                 continue
-            sid = batch_students[chosen_batch].pop(0)
+            sid = batch_students[chosen_batch].popleft()
             column_assignments.append({
                 'Room': room,
                 'Row': r,
@@ -421,34 +1261,55 @@ def seat_leftover_in_room_min_batches(room, df_rooms, batch_students, seat_assig
             if len(batch_students[chosen_batch]) == 0:
                 sorted_batches.remove(chosen_batch)
     seat_assignments.extend(column_assignments)
+    if seat_indexes is not None and column_assignments:
+        room_index = seat_indexes.setdefault(room, new_seat_index())
+        for seat in column_assignments:
+            add_seat_to_index(room_index, seat)
 
 # ============================================================
 # SEAT PLAN PDF GENERATION
 # ============================================================
-def generate_seating_plan_pdf(room, rows, cols, seat_assignments, metadata, student_info_lookup):
-    pdf = FPDF(orientation="L", unit="mm", format="A4")
+def generate_seating_plan_pdf(room, rows, cols, seat_assignments, metadata, student_info_lookup, seat_index=None, blocked_seats=None, ctx=None, pdf=None):
+    """Render one room's seat plan; with pdf given, add it as bookmarked pages of that document."""
+    ctx = ctx or GenerationContext()
+    if seat_index is None:
+        seat_index = build_seat_index(seat_assignments)
+    if blocked_seats is None:
+        blocked_seats = DEFAULT_BLOCKED_SEATS.get(room, frozenset())
+    seat_grid = seat_index["grid"]
+    combined = pdf is not None
+    if not combined:
+        pdf_output_path = os.path.join(ctx.seat_plan_output_folder, f"Seating_Plan_Room_{room}.pdf")
+        cache_key = render_cache_key("seat_plan", room, rows, cols, seat_assignments, metadata, student_info_lookup,
+                                     sorted(blocked_seats), ctx.seatplan_line1, ctx.seatplan_line2)
+        if restore_cached_render(cache_key, pdf_output_path):
+            print(f"Room {room} unchanged; reused cached PDF at {pdf_output_path}")
+            return pdf_output_path
+        pdf = FPDF(orientation="L", unit="mm", format="A4")
     pdf.add_page()
+    if combined:
+        pdf.bookmark(f"Room {room}")
     pdf.set_auto_page_break(auto=False)
     pdf.set_font("Arial", "B", 9)
     total_cols = cols + 2
     col_width = 280 / total_cols
 
     exam_date_raw = metadata.get("Exam date", "")
+    from dateutil import parser
     try:
         dt = parser.parse(str(exam_date_raw), dayfirst=True)
         formatted_date = dt.strftime("%d-%m-%Y")
     except Exception:
         formatted_date = exam_date_raw
     exam_info = f"Exam Date: {formatted_date}    Time: {metadata.get('Time', '')}"
-    header_line1 = CUSTOM_SEATPLAN_LINE1 if CUSTOM_SEATPLAN_LINE1 else "Seat Plan"
-    header_line2 = CUSTOM_SEATPLAN_LINE2 if CUSTOM_SEATPLAN_LINE2 else exam_info
+    header_line1 = ctx.seatplan_line1 if ctx.seatplan_line1 else "Seat Plan"
+    header_line2 = ctx.seatplan_line2 if ctx.seatplan_line2 else exam_info
 
     pdf.set_font("Arial", "B", 10)
     pdf.cell(0, 8, header_line1, ln=True, align="C")
     pdf.set_font("Arial", "", 9)
     pdf.cell(0, 8, header_line2, ln=True, align="C")
-    blocked_seats_count = sum(1 for r in range(1, rows + 1) for c in range(1, cols + 1)
-                              if is_blocked_seat(room, r, c))
+    blocked_seats_count = sum(1 for r, c in blocked_seats if 1 <= r <= rows and 1 <= c <= cols)
     adjusted_capacity = (rows * cols) - blocked_seats_count
     pdf.cell(0, 8, f"Room #{room}    Capacity = {adjusted_capacity}", ln=True, align="C")
     
@@ -459,8 +1320,8 @@ def generate_seating_plan_pdf(room, rows, cols, seat_assignments, metadata, stud
     
     pdf.cell(col_width, 8, "Batch/Sl. No.", border=1, align="C")
     for i in range(cols):
-        batches_in_col = [seat['Batch'] for seat in seat_assignments if seat['Column'] == i + 1]
-        unique_batches = "+".join(sorted(map(str, set(batches_in_col))))
+        batches_in_col = seat_index["batches_by_column"].get(i + 1, set())
+        unique_batches = "+".join(sorted(map(str, batches_in_col)))
         pdf.cell(col_width, 8, unique_batches, border=1, align="C")
     pdf.cell(col_width, 8, "Batch/Sl. No.", border=1, ln=True, align="C")
     
@@ -468,10 +1329,10 @@ def generate_seating_plan_pdf(room, rows, cols, seat_assignments, metadata, stud
     for r in range(1, rows + 1):
         pdf.cell(col_width, 8, str(r), border=1, align="C")
         for c in range(1, cols + 1):
-            if is_blocked_seat(room, r, c):
+            if (r, c) in blocked_seats:
                 student_info = "X"
             else:
-                seat = next((st for st in seat_assignments if st['Row'] == r and st['Column'] == c), None)
+                seat = seat_grid.get((r, c))
                 if seat:
                     stud_id = str(seat['Student ID']).strip()
                     info = student_info_lookup.get(stud_id, {})
@@ -484,7 +1345,7 @@ def generate_seating_plan_pdf(room, rows, cols, seat_assignments, metadata, stud
                         student_info = f"{stud_id} ({section})"
                 else:
                     student_info = ""
-            text_width = pdf.get_string_width(student_info)
+            text_width = string_width(pdf, student_info)
             if text_width > col_width - 2:
                 current_font_size = pdf.font_size_pt
                 pdf.set_font("Arial", "", max(6, current_font_size - 2))
@@ -500,9 +1361,9 @@ def generate_seating_plan_pdf(room, rows, cols, seat_assignments, metadata, stud
         pdf.cell(col_width, 8, "", border=1, ln=True)
     
     pdf.set_font("Arial", "B", 8)
-    room_batches = set(seat['Batch'] for seat in seat_assignments)
-    for batch in sorted(room_batches):
-        students = [seat['Student ID'] for seat in seat_assignments if seat['Batch'] == batch]
+    students_by_batch = seat_index["students_by_batch"]
+    for batch in sorted(students_by_batch):
+        students = students_by_batch[batch]
         if students:
             batch_summary = f"{batch}th = {len(students)} = ({students[0]}-{students[-1]})"
         else:
@@ -511,29 +1372,50 @@ def generate_seating_plan_pdf(room, rows, cols, seat_assignments, metadata, stud
         pdf.cell(cols * col_width, 8, batch_summary, border=1, align="C")
         pdf.cell(col_width, 8, "", border=1, ln=True)
     
-    pdf_output_path = os.path.join(SEAT_PLAN_OUTPUT_FOLDER, f"Seating_Plan_Room_{room}.pdf")
+    if combined:
+        return None
     pdf.output(pdf_output_path)
+    store_cached_render(cache_key, pdf_output_path)
     print(f"PDF generated for Room {room} at {pdf_output_path}")
     return pdf_output_path
 
+def seating_plan_job(room, room_data, room_seats, metadata, student_info_lookup, seat_index=None, ctx=None):
+    # Only ship the roster entries this room needs to the worker.
+    room_lookup = {}
+    for seat in room_seats:
+        stud_id = str(seat['Student ID']).strip()
+        if stud_id in student_info_lookup:
+            room_lookup[stud_id] = student_info_lookup[stud_id]
+    return (generate_seating_plan_pdf, (room, room_data['Row'], room_data['Column'], room_seats, metadata,
+                                        room_lookup, seat_index, room_data['blocked'], ctx))
+
 # ------------------------------------------------------------
 # Modified generate_seating_plan_display() with optional PDF creation
 # ------------------------------------------------------------
-def generate_seating_plan_display(df_students, df_rooms, metadata, output_dir, produce_pdf=True):
+def normalize_student_frame(df_students):
     df_students["Student ID"] = df_students["Student ID"].astype(str).str.strip()
     df_students["M Batch"] = df_students["M Batch"].fillna("").astype(str).str.replace(".0", "", regex=False).str.strip()
     df_students["Batch Number"] = df_students["Batch Number"].fillna("").astype(str).str.strip()
     df_students["Section"] = df_students["Section"].fillna("").astype(str).str.strip()
+
+def generate_seating_plan_display(df_students, df_rooms, metadata, output_dir, produce_pdf=True, ctx=None):
+    ctx = ctx or GenerationContext()
+    seating_started = time.perf_counter()
+    normalize_student_frame(df_students)
     student_info_lookup = df_students.set_index("Student ID").to_dict("index")
+    # Batch -> queue of unseated student IDs, consumed from the front by both seating phases.
     batch_students = {}
     for batch, grp in df_students.groupby('Batch Number'):
-        batch_students[batch] = list(grp['Student ID'])
+        batch_students[batch] = deque(grp['Student ID'])
     df_rooms['Room'] = df_rooms['Room'].astype(str)
+    rooms = build_room_index(df_rooms)
     try:
         all_rooms = sorted(df_rooms['Room'].unique(), key=lambda x: int(str(x).strip()))
     except Exception:
         all_rooms = sorted(df_rooms['Room'].unique(), key=lambda x: str(x).strip())
     seat_assignments = []
+    seat_indexes = {}
+    render_jobs = {}
     two_batch_phase = True
     for room in all_rooms:
         room = str(room).strip()
@@ -544,26 +1426,114 @@ def generate_seating_plan_display(df_students, df_rooms, metadata, output_dir, p
         print(f"Seating students in Room {room} ...")
         prev_count = len(seat_assignments)
         if two_batch_phase:
-            success = try_seat_two_batches_in_room(room, df_rooms, batch_students, seat_assignments)
+            success = try_seat_two_batches_in_room(room, rooms, batch_students, seat_assignments, seat_indexes)
             if not success:
                 print(f"Cannot fill Room {room} with exactly 2 batches. Switching to leftover mode.")
-                seat_leftover_in_room_min_batches(room, df_rooms, batch_students, seat_assignments)
+                seat_leftover_in_room_min_batches(room, rooms, batch_students, seat_assignments, seat_indexes)
                 two_batch_phase = False
         else:
-            seat_leftover_in_room_min_batches(room, df_rooms, batch_students, seat_assignments)
+            seat_leftover_in_room_min_batches(room, rooms, batch_students, seat_assignments, seat_indexes)
         new_count = len(seat_assignments)
-        current_room_seats = [s for s in seat_assignments if str(s.get("Room") or s.get("Room No") or "").strip() == room]
+        # Both seating modes append this room's seats together at the end.
+        current_room_seats = seat_assignments[prev_count:]
         if produce_pdf and (new_count > prev_count) and current_room_seats:
-            room_data = df_rooms[df_rooms['Room'].astype(str).str.strip() == room].iloc[0]
-            rows, cols = room_data['Row'], room_data['Column']
-            generate_seating_plan_pdf(room, rows, cols, current_room_seats, metadata, student_info_lookup)
+            render_jobs[room] = seating_plan_job(room, rooms[room], current_room_seats, metadata,
+                                                 student_info_lookup, seat_indexes.get(room), ctx)
         else:
             print(f"Room {room} has {len(current_room_seats)} seats assigned (no PDF generated).")
+    unseated = sum(len(queue) for queue in batch_students.values())
+    if unseated:
+        print(f"Warning: {unseated} student(s) could not be seated; every room is full.")
+    metrics.observe("seating_seconds", time.perf_counter() - seating_started)
+    metrics.increment("seats_assigned_total", len(seat_assignments))
+    run_render_jobs(list(render_jobs.values()), ctx=ctx)
     return seat_assignments
 
+def seating_plan_jobs(df_students, df_rooms, seat_assignments, metadata, ctx=None):
+    """One render job per room that has seats assigned."""
+    ctx = ctx or GenerationContext()
+    student_info_lookup = df_students.set_index("Student ID").to_dict("index")
+    rooms = build_room_index(df_rooms)
+    assignments_by_room = {}
+    for seat in seat_assignments:
+        room = str(seat.get("Room") or seat.get("Room No") or "").strip()
+        assignments_by_room.setdefault(room, []).append(seat)
+    return [seating_plan_job(room, rooms[room], room_seats, metadata, student_info_lookup, ctx=ctx)
+            for room, room_seats in assignments_by_room.items()]
+
+def generate_seating_plan_pdfs(df_students, df_rooms, seat_assignments, metadata, combined=False, ctx=None):
+    """Render seat plans from already computed assignments.
+
+    One PDF per room, or with combined=True a single Seating_Plans.pdf with a
+    bookmark per room.
+    """
+    ctx = ctx or GenerationContext()
+    jobs = seating_plan_jobs(df_students, df_rooms, seat_assignments, metadata, ctx)
+    if combined:
+        return render_jobs_to_single_pdf(jobs, BookmarkedPDF(orientation="L", unit="mm", format="A4"),
+                                         os.path.join(ctx.seat_plan_output_folder, "Seating_Plans.pdf"), ctx)
+    return run_render_jobs(jobs, ctx=ctx)
+
+# ------------------------------------------------------------
+# Persisted seat assignments (computed once per roster/room info)
+# ------------------------------------------------------------
+def get_seating_store_path(ctx=None):
+    ctx = ctx or GenerationContext()
+    return os.path.splitext(ctx.merged_excel_path)[0] + "_seating.pkl"
+
+def frame_fingerprint(df):
+    digest = hashlib.sha256()
+    digest.update(repr(list(df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()
+
+def seating_key(df_students, df_rooms):
+    return f"{frame_fingerprint(df_students)}-{frame_fingerprint(df_rooms)}-v{SEATING_ALGORITHM_VERSION}"
+
+def get_seat_assignments(df_students, df_rooms, metadata, ctx=None):
+    """Return seat assignments for this roster and room info, seating at most once.
+
+    Normalizes df_students and df_rooms in place exactly like
+    generate_seating_plan_display(), so callers see the same frames whether
+    or not the stored assignments were reused.
+    """
+    ctx = ctx or GenerationContext()
+    key = seating_key(df_students, df_rooms)
+    store_path = get_seating_store_path(ctx)
+    try:
+        with metrics.timed("store_read_seconds", file="seating"):
+            stored = pd.read_pickle(store_path)
+        if stored.get("key") == key:
+            print(f"Reusing stored seat assignments from {store_path}")
+            normalize_student_frame(df_students)
+            df_rooms['Room'] = df_rooms['Room'].astype(str)
+            return stored["assignments"]
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Error loading stored seat assignments: {e}")
+    seat_assignments = generate_seating_plan_display(df_students, df_rooms, metadata, ctx.output_folder, produce_pdf=False, ctx=ctx)
+    tmp_path = unique_tmp_path(store_path)
+    pd.to_pickle({"key": key, "assignments": seat_assignments}, tmp_path)
+    os.replace(tmp_path, store_path)
+    print(f"Seat assignments saved at: {store_path}")
+    return seat_assignments
+
+def precompute_seat_assignments(ctx=None):
+    """Seat students right after a merge so the first generate request is fast."""
+    ctx = ctx or GenerationContext()
+    try:
+        df_students = load_merged_students(ctx)
+        df_rooms = load_room_info(ctx)
+    except Exception as e:
+        print(f"Skipping seat precomputation: {e}")
+        return
+    get_seat_assignments(df_students, df_rooms, {}, ctx)
+
 # ============================================================
 # SUMMARY FUNCTIONS
 # ============================================================
+@metrics.timed("summary_aggregation_seconds")
 def get_summary_data(df_students, seating_assignments):
     if not seating_assignments:
         print("No seating assignments available; returning empty summary.")
@@ -572,18 +1542,16 @@ def get_summary_data(df_students, seating_assignments):
     df_students["M Batch"] = df_students["M Batch"].astype(str).str.strip()
     df_students["Batch Number"] = df_students["Batch Number"].astype(str).str.strip()
     df_students["Section"] = df_students["Section"].astype(str).str.strip()
-    seat_order = {}
-    for i, s in enumerate(seating_assignments):
-        sid = str(s["Student ID"]).strip()
-        seat_order[sid] = i
     sa_df = pd.DataFrame(seating_assignments)
     if "Student ID" not in sa_df.columns:
         print("Warning: 'Student ID' column not found in seating assignments; returning empty summary.")
         return {}, {}, {}, 0
     sa_df["Student ID"] = sa_df["Student ID"].astype(str).str.strip()
+    # Position of each student's (last) seat; rows are listed in this order.
+    seat_order = pd.Series(range(len(sa_df)), index=sa_df["Student ID"])
+    seat_order = seat_order[~seat_order.index.duplicated(keep="last")]
     merged = pd.merge(sa_df, df_students[["Student ID", "Section", "M Batch", "Batch Number"]], on="Student ID", how="left")
     merged["Batch"] = merged["Batch"].astype(str).str.strip()
-    merged["MID"] = merged["Student ID"].str[4:6]
     if "Room" in merged.columns:
         merged["Room"] = merged["Room"].astype(str).str.strip()
     elif "Room No" in merged.columns:
@@ -591,54 +1559,58 @@ def get_summary_data(df_students, seating_assignments):
     else:
         merged["Room"] = ""
     merged = merged.drop_duplicates(subset=["Student ID", "Room", "Row", "Column"])
+    if merged.empty:
+        return {}, {}, {}, 0
+    # Missing roster values read as "nan", as str() of them would.
+    m_batch = merged["M Batch"].fillna("nan").astype(str).str.strip()
+    section = merged["Section"].fillna("nan").astype(str).str.strip()
+    same = merged["Batch Number"].fillna("nan").astype(str).str.strip() == m_batch
+    # Rooms, then batches within a room, keep the order they first appear in.
+    merged["room_order"] = pd.factorize(merged["Room"])[0]
+    merged["batch_order"] = merged.groupby(["Room", "Batch"], sort=False).ngroup()
+    merged["seat_order"] = merged["Student ID"].map(seat_order).fillna(9999999)
+    merged["day"] = merged["Student ID"].str[4:6] == "38"
+    merged["diff"] = ~same
+    merged["m_batch"] = m_batch
+    merged["section"] = section
+    merged = merged.sort_values(["room_order", "batch_order", "seat_order"], kind="stable")
+    merged["subgroup"] = merged.groupby(["batch_order", "diff", "day", "m_batch", "section"], sort=False).ngroup()
+    subgroups = merged.groupby("subgroup", sort=True).agg(
+        room=("Room", "first"),
+        batch=("Batch", "first"),
+        diff=("diff", "first"),
+        day=("day", "first"),
+        m_batch=("m_batch", "first"),
+        section=("section", "first"),
+        first_id=("Student ID", "first"),
+        last_id=("Student ID", "last"),
+        count=("Student ID", "count"),
+    )
     summary_data = {}
     row_totals = {}
     col_totals = {}
     grand_total = 0
-    for room, group_room in merged.groupby("Room", sort=False):
-        summary_data[room] = {}
-        room_total = 0
-        for batch, group_batch in group_room.groupby("Batch", sort=False):
-            group_batch = group_batch.copy()
-            group_batch["special"] = group_batch["MID"].apply(lambda x: "DAY" if str(x) == "38" else "")
-            group_batch["subgroup_key"] = group_batch.apply(
-                lambda row: (
-                    "SAME" if str(row["Batch Number"]).strip() == str(row["M Batch"]).strip() else "DIFF",
-                    row["special"],
-                    str(row["M Batch"]).strip(),
-                    str(row["Section"]).strip()
-                ),
-                axis=1
-            )
-            group_batch = group_batch.sort_values("Student ID", key=lambda col: col.map(lambda sid: seat_order.get(str(sid).strip(), 9999999)))
-            subgroup_total = 0
-            subgroup_lines = []
-            for key, subgroup in group_batch.groupby("subgroup_key", sort=False):
-                ids = subgroup["Student ID"].tolist()
-                count = len(ids)
-                subgroup_total += count
-                if key[0] == "DIFF":
-                    if count > 1:
-                        line = f"({ids[0]}-{ids[-1]}) ({key[2]} {key[3]})"
-                    else:
-                        line = f"{ids[0]} ({key[2]} {key[3]})"
-                else:
-                    if count > 1:
-                        line = f"({ids[0]}-{ids[-1]}) ({key[3]})"
-                    else:
-                        line = f"{ids[0]} ({key[3]})"
-                if key[1] == "DAY":
-                    line += " (Day)"
-                subgroup_lines.append(line)
-            cell_content = "\n".join(subgroup_lines) + f"\nTotal={subgroup_total}"
-            summary_data[room][batch] = cell_content
-            col_totals[batch] = col_totals.get(batch, 0) + subgroup_total
-            room_total += subgroup_total
-            grand_total += subgroup_total
-        row_totals[room] = room_total
+    cell_lines = {}
+    for sub in subgroups.itertuples(index=False):
+        label = f"{sub.m_batch} {sub.section}" if sub.diff else sub.section
+        if sub.count > 1:
+            line = f"({sub.first_id}-{sub.last_id}) ({label})"
+        else:
+            line = f"{sub.first_id} ({label})"
+        if sub.day:
+            line += " (Day)"
+        cell = cell_lines.setdefault((sub.room, sub.batch), [[], 0])
+        cell[0].append(line)
+        cell[1] += int(sub.count)
+    for (room, batch), (lines, subgroup_total) in cell_lines.items():
+        summary_data.setdefault(room, {})[batch] = "\n".join(lines) + f"\nTotal={subgroup_total}"
+        col_totals[batch] = col_totals.get(batch, 0) + subgroup_total
+        row_totals[room] = row_totals.get(room, 0) + subgroup_total
+        grand_total += subgroup_total
     return summary_data, row_totals, col_totals, grand_total
 
-def generate_summary_pdf(df_students, seating_assignments, summary_header, output_file):
+def generate_summary_pdf(df_students, seating_assignments, summary_header, output_file, ctx=None):
+    ctx = ctx or GenerationContext()
     summary_data, row_totals, col_totals, grand_total = get_summary_data(df_students, seating_assignments)
     rooms = list(summary_data.keys())
     try:
@@ -650,19 +1622,24 @@ def generate_summary_pdf(df_students, seating_assignments, summary_header, outpu
         batches.sort(key=lambda x: int(''.join(filter(str.isdigit, x))) if any(ch.isdigit() for ch in x) else x)
     except:
         batches.sort()
+    cache_key = render_cache_key("summary", rooms, batches, summary_data, row_totals, col_totals, grand_total,
+                                 summary_header, ctx.summary_line1, ctx.summary_line2, ctx.summary_line3)
+    if restore_cached_render(cache_key, output_file):
+        print(f"Summary unchanged; reused cached PDF at {output_file}")
+        return output_file
     pdf = FPDF(orientation="L", unit="mm", format="A3")
     pdf.add_page()
     margin = 10
     available_width = 420 - 2 * margin
     pdf.set_auto_page_break(auto=True, margin=10)
     pdf.set_font("Arial", "B", 16)
-    title_line = CUSTOM_SUMMARY_LINE1 if CUSTOM_SUMMARY_LINE1 else f"{summary_header.get('Term', '')} Term Exam {summary_header.get('Semester', '')} ({summary_header.get('Shift', '')} Batch)"
+    title_line = ctx.summary_line1 if ctx.summary_line1 else f"{summary_header.get('Term', '')} Term Exam {summary_header.get('Semester', '')} ({summary_header.get('Shift', '')} Batch)"
     pdf.cell(0, 10, title_line, ln=True, align="C")
     pdf.set_font("Arial", "B", 14)
-    dept_line = CUSTOM_SUMMARY_LINE2 if CUSTOM_SUMMARY_LINE2 else "Department of Civil Engineering, Uttara University"
+    dept_line = ctx.summary_line2 if ctx.summary_line2 else "Department of Civil Engineering, Uttara University"
     pdf.cell(0, 8, dept_line, ln=True, align="C")
     pdf.set_font("Arial", "", 12)
-    date_time_line = CUSTOM_SUMMARY_LINE3 if CUSTOM_SUMMARY_LINE3 else f"Date: {summary_header.get('Exam date', '')} ({summary_header.get('Time', '').strip()})_{summary_header.get('Day', '')}"
+    date_time_line = ctx.summary_line3 if ctx.summary_line3 else f"Date: {summary_header.get('Exam date', '')} ({summary_header.get('Time', '').strip()})_{summary_header.get('Day', '')}"
     pdf.cell(0, 8, date_time_line, ln=True, align="C")
     pdf.ln(5)
     total_columns = 2 + len(batches)
@@ -685,7 +1662,9 @@ def generate_summary_pdf(df_students, seating_assignments, summary_header, outpu
     pdf.set_font("Arial", "B", 10)
     vertical_centered_row(pdf, footer_row, [cell_width] * total_columns, line_height=8, alignments=["C"] * total_columns)
     pdf.output(output_file)
+    store_cached_render(cache_key, output_file)
     print(f"Summary PDF generated: {output_file}")
+    return output_file
 
 # ============================================================
 # ENVELOPE & ATTENDANCE FUNCTIONS
@@ -703,7 +1682,8 @@ def generate_envelope_data(df_courses):
         })
     return envelope_list
 
-def draw_envelope(pdf, envelope, exam_details, x, y, w, h):
+def draw_envelope(pdf, envelope, exam_details, x, y, w, h, ctx=None):
+    ctx = ctx or GenerationContext()
     # Draw the envelope border
     pdf.rect(x, y, w, h)
     inner_margin = 5
@@ -716,10 +1696,10 @@ def draw_envelope(pdf, envelope, exam_details, x, y, w, h):
     pdf.set_font("Arial", "B", 16)
     
     # Header lines (these remain unchanged)
-    pdf.cell(available_width, 8, CUSTOM_ENVELOPES_LINE1 if CUSTOM_ENVELOPES_LINE1 else "DEPARTMENT OF CIVIL ENGINEERING", border=0, ln=1, align="C")
-    pdf.cell(available_width, 8, CUSTOM_ENVELOPES_LINE2 if CUSTOM_ENVELOPES_LINE2 else "UTTARA UNIVERSITY", border=0, ln=1, align="C")
-    pdf.cell(available_width, 8, CUSTOM_ENVELOPES_LINE3 if CUSTOM_ENVELOPES_LINE3 else "MAKEUP SEMESTER FINAL EXAM", border=0, ln=1, align="C")
-    pdf.cell(available_width, 8, CUSTOM_ENVELOPES_LINE4 if CUSTOM_ENVELOPES_LINE4 else "FALL 2024 SEMESTER", border=0, ln=1, align="C")
+    pdf.cell(available_width, 8, ctx.envelopes_line1 if ctx.envelopes_line1 else "DEPARTMENT OF CIVIL ENGINEERING", border=0, ln=1, align="C")
+    pdf.cell(available_width, 8, ctx.envelopes_line2 if ctx.envelopes_line2 else "UTTARA UNIVERSITY", border=0, ln=1, align="C")
+    pdf.cell(available_width, 8, ctx.envelopes_line3 if ctx.envelopes_line3 else "MAKEUP SEMESTER FINAL EXAM", border=0, ln=1, align="C")
+    pdf.cell(available_width, 8, ctx.envelopes_line4 if ctx.envelopes_line4 else "FALL 2024 SEMESTER", border=0, ln=1, align="C")
     pdf.ln(2)
     
     # Now print the details below the header
@@ -735,7 +1715,13 @@ def draw_envelope(pdf, envelope, exam_details, x, y, w, h):
     pdf.cell(available_width, 8, "No. of Copies:", ln=1, align="C")
     pdf.cell(available_width, 8, "Signature of Invigilator:", ln=1, align="C")
 
-def generate_envelopes_pdf(envelope_list, exam_details, output_file):
+def generate_envelopes_pdf(envelope_list, exam_details, output_file, ctx=None):
+    ctx = ctx or GenerationContext()
+    cache_key = render_cache_key("envelopes", envelope_list, exam_details, ctx.envelopes_line1,
+                                 ctx.envelopes_line2, ctx.envelopes_line3, ctx.envelopes_line4)
+    if restore_cached_render(cache_key, output_file):
+        print(f"Envelopes unchanged; reused cached PDF at {output_file}")
+        return output_file
     pdf = FPDF(orientation="P", unit="mm", format="A4")
     pdf.add_page()
     margin = 10
@@ -755,18 +1741,33 @@ def generate_envelopes_pdf(envelope_list, exam_details, output_file):
         else:
             x = margin
             y = margin + envelope_height + gap_between
-        draw_envelope(pdf, env, exam_details, x, y, envelope_width, envelope_height)
+        draw_envelope(pdf, env, exam_details, x, y, envelope_width, envelope_height, ctx)
         count += 1
     pdf.output(output_file)
+    store_cached_render(cache_key, output_file)
     print(f"Envelopes PDF generated: {output_file}")
+    return output_file
 
 # ------------------------------------------------------------
 # ATTENDANCE SHEET PDF GENERATION (Modified with invigilator table)
 # ------------------------------------------------------------
-def generate_attendance_sheet_pdf(group_info, student_list, metadata, room_no, group_room_counts, output_dir):
-    pdf = FPDF(orientation="P", unit="mm", format="A4")
+def generate_attendance_sheet_pdf(group_info, student_list, metadata, room_no, group_room_counts, output_dir, ctx=None, pdf=None):
+    ctx = ctx or GenerationContext()
+    combined = pdf is not None
+    if not combined:
+        filename = f"Attendance_{group_info.get('Faculty Name','')}_{group_info.get('Batch Number','')}_{group_info.get('Section','')}_Room_{room_no}.pdf"
+        pdf_output_path = os.path.join(ctx.attendance_output_folder, filename)
+        cache_key = render_cache_key("attendance", group_info, student_list, metadata, room_no, group_room_counts,
+                                     ctx.attendance_line1, ctx.attendance_line2, ctx.attendance_program)
+        if restore_cached_render(cache_key, pdf_output_path):
+            print(f"Attendance sheet unchanged; reused cached PDF at {pdf_output_path}")
+            return pdf_output_path
+        pdf = FPDF(orientation="P", unit="mm", format="A4")
     pdf.set_auto_page_break(True, margin=10)
     pdf.add_page()
+    if combined:
+        pdf.bookmark(f"{group_info.get('Faculty Name','')} / {group_info.get('Batch Number','')} / "
+                     f"{group_info.get('Section','')} / Room {room_no}")
     logo_path = os.path.join(os.getcwd(), "static", "uu.png")
     logo_width = 30
     logo_x = (210 - logo_width) / 2
@@ -777,14 +1778,14 @@ def generate_attendance_sheet_pdf(group_info, student_list, metadata, room_no, g
     pdf.ln(16)
     # Use custom attendance headers if provided
     pdf.set_font("Arial", "B", 16)
-    header_line1 = CUSTOM_ATTENDANCE_LINE1 if CUSTOM_ATTENDANCE_LINE1 else "UTTARA UNIVERSITY"
+    header_line1 = ctx.attendance_line1 if ctx.attendance_line1 else "UTTARA UNIVERSITY"
     pdf.cell(0, 10, header_line1, ln=True, align="C")
     pdf.ln(1)
     pdf.set_font("Arial", "B", 14)
-    header_line2 = CUSTOM_ATTENDANCE_LINE2 if CUSTOM_ATTENDANCE_LINE2 else f"{metadata.get('Semester', 'Unknown Semester')} - {metadata.get('Term', 'Unknown Term')} Term Exam Attendance"
+    header_line2 = ctx.attendance_line2 if ctx.attendance_line2 else f"{metadata.get('Semester', 'Unknown Semester')} - {metadata.get('Term', 'Unknown Term')} Term Exam Attendance"
     pdf.cell(0, 10, header_line2, ln=True, align="C")
     pdf.ln(5)
-    print_top_info_table(pdf, group_info, metadata)
+    print_top_info_table(pdf, group_info, metadata, ctx)
     pdf.ln(5)
     # ---- Student Attendance Table ----
     student_col_widths = [10, 30, 55, 15, 20, 20, 20, 20]  # Total = 190 mm
@@ -842,63 +1843,71 @@ def generate_attendance_sheet_pdf(group_info, student_list, metadata, room_no, g
     pdf.cell(60, 10, "", border="B", align="C")
     pdf.ln(15)
     
-    filename = f"Attendance_{group_info.get('Faculty Name','')}_{group_info.get('Batch Number','')}_{group_info.get('Section','')}_Room_{room_no}.pdf"
-    pdf_output_path = os.path.join(ATTENDANCE_OUTPUT_FOLDER, filename)
+    if combined:
+        return None
     pdf.output(pdf_output_path)
+    store_cached_render(cache_key, pdf_output_path)
     print(f"Generated attendance sheet: {pdf_output_path}")
     return pdf_output_path
 
 # ============================================================
 # "ONE TYPE" GENERATION FUNCTIONS (NO re-merge)
 # ============================================================
-def generate_seat_plan_only():
+def generate_seat_plan_only(combined=False, ctx=None):
+    ctx = ctx or GenerationContext()
+    ctx.make_output_folders()
     try:
-        df_students = pd.read_excel(MERGED_EXCEL_PATH)
+        df_students = load_merged_students(ctx)
     except Exception as e:
         print(f"Error loading student data: {e}")
         return
     try:
-        df_rooms = pd.read_excel(get_room_info_path())
+        df_rooms = load_room_info(ctx)
     except Exception as e:
         print(f"Error loading room data: {e}")
         return
     metadata = {}  # Extend as needed
-    generate_seating_plan_display(df_students, df_rooms, metadata, OUTPUT_FOLDER, produce_pdf=True)
+    seat_assignments = get_seat_assignments(df_students, df_rooms, metadata, ctx)
+    generate_seating_plan_pdfs(df_students, df_rooms, seat_assignments, metadata, combined, ctx)
 
-def generate_attendance_only():
+def generate_attendance_only(combined=False, ctx=None):
+    ctx = ctx or GenerationContext()
+    ctx.make_output_folders()
     try:
-        df_students = pd.read_excel(MERGED_EXCEL_PATH)
+        df_students = load_merged_students(ctx)
     except Exception as e:
         print(f"Error loading student data: {e}")
         return
-    print("DEBUG: Current ROOM_INFO_PATH =", get_room_info_path())
+    print("DEBUG: Current ROOM_INFO_PATH =", ctx.get_room_info_path())
     try:
-        df_rooms = pd.read_excel(get_room_info_path())
+        df_rooms = load_room_info(ctx)
     except Exception as e:
         print(f"Error loading room data: {e}")
         return
     # Set metadata with the custom attendance program value.
-    metadata = {"Program": CUSTOM_ATTENDANCE_PROGRAM}
+    metadata = {"Program": ctx.attendance_program}
     # For attendance, do not produce seat plan PDFs.
-    seat_assignments = generate_seating_plan_display(df_students, df_rooms, metadata, OUTPUT_FOLDER, produce_pdf=False)
+    seat_assignments = get_seat_assignments(df_students, df_rooms, metadata, ctx)
     if seat_assignments is None:
         seat_assignments = []
-    generate_attendance_sheets(df_students, metadata, seat_assignments, OUTPUT_FOLDER)
+    generate_attendance_sheets(df_students, metadata, seat_assignments, ctx.output_folder, combined, ctx)
 
-def generate_summary_only():
+def generate_summary_only(ctx=None):
+    ctx = ctx or GenerationContext()
+    ctx.make_output_folders()
     try:
-        df_students = pd.read_excel(MERGED_EXCEL_PATH)
+        df_students = load_merged_students(ctx)
     except Exception as e:
         print(f"Error loading student data: {e}")
         return
-    print("DEBUG: Current ROOM_INFO_PATH =", get_room_info_path())
+    print("DEBUG: Current ROOM_INFO_PATH =", ctx.get_room_info_path())
     try:
-        df_rooms = pd.read_excel(get_room_info_path())
+        df_rooms = load_room_info(ctx)
     except Exception as e:
         print(f"Error loading room data: {e}")
         return
     metadata = {}
-    seat_assignments = generate_seating_plan_display(df_students, df_rooms, metadata, OUTPUT_FOLDER, produce_pdf=False)
+    seat_assignments = get_seat_assignments(df_students, df_rooms, metadata, ctx)
     if seat_assignments is None:
         seat_assignments = []
     summary_header = {
@@ -909,24 +1918,87 @@ def generate_summary_only():
         "Time": "",
         "Day": ""
     }
-    generate_summary_pdf(df_students, seat_assignments, summary_header, os.path.join(OUTPUT_FOLDER, "Summary.pdf"))
+    run_render_jobs([(generate_summary_pdf, (df_students, seat_assignments, summary_header,
+                                             os.path.join(ctx.output_folder, "Summary.pdf"), ctx))], ctx=ctx)
 
-def generate_envelopes_only():
+def generate_envelopes_only(ctx=None):
+    ctx = ctx or GenerationContext()
+    ctx.make_output_folders()
     try:
-        df_courses = pd.read_excel(MERGED_EXCEL_PATH)
+        df_courses = load_merged_students(ctx)
     except Exception as e:
         print(f"Error loading courses data: {e}")
         return
     exam_details = {"Exam Line1": "", "Exam Line2": ""}
     envelope_list = generate_envelope_data(df_courses)
-    envelopes_output_file = os.path.join(OUTPUT_FOLDER, "Envelopes.pdf")
-    generate_envelopes_pdf(envelope_list, exam_details, envelopes_output_file)
+    envelopes_output_file = os.path.join(ctx.output_folder, "Envelopes.pdf")
+    run_render_jobs([(generate_envelopes_pdf, (envelope_list, exam_details, envelopes_output_file, ctx))], ctx=ctx)
+
+# ============================================================
+# ALL DOCUMENTS IN ONE PASS
+# ============================================================
+SUMMARY_HEADER_FIELDS = ["Term", "Semester", "Shift", "Exam date", "Time", "Day"]
+
+def generate_all(combined=False, metadata=None, exam_details=None, ctx=None):
+    """Seat plans, attendance sheets, summary and envelopes from one load of the inputs.
+
+    The roster and room info are read once and seated once, and every
+    per-file document goes through a single run_render_jobs() call, so one
+    worker pool renders them all. With combined=True the seat plans and the
+    attendance sheets are each one bookmarked PDF instead.
+    """
+    ctx = ctx or GenerationContext()
+    metadata = metadata or {}
+    exam_details = exam_details or {"Exam Line1": "", "Exam Line2": ""}
+    try:
+        df_students = load_merged_students(ctx)
+    except Exception as e:
+        print(f"Error loading student data: {e}")
+        return
+    try:
+        df_rooms = load_room_info(ctx)
+    except Exception as e:
+        print(f"Error loading room data: {e}")
+        return
+    # Envelopes group the roster as loaded; seating normalizes df_students in place.
+    envelope_list = generate_envelope_data(df_students)
+    seat_assignments = get_seat_assignments(df_students, df_rooms, metadata, ctx) or []
+    ctx.make_output_folders()
+    seat_jobs = seating_plan_jobs(df_students, df_rooms, seat_assignments, metadata, ctx)
+    attendance_metadata = {"Program": ctx.attendance_program, **metadata}
+    attendance_jobs, _ = attendance_sheet_jobs(df_students, attendance_metadata, seat_assignments, ctx)
+    summary_header = {field: metadata.get(field, "") for field in SUMMARY_HEADER_FIELDS}
+    jobs = [
+        (generate_summary_pdf, (df_students, seat_assignments, summary_header,
+                                os.path.join(ctx.output_folder, "Summary.pdf"), ctx)),
+        (generate_envelopes_pdf, (envelope_list, exam_details, os.path.join(ctx.output_folder, "Envelopes.pdf"), ctx)),
+    ]
+    if combined:
+        render_jobs_to_single_pdf(seat_jobs, BookmarkedPDF(orientation="L", unit="mm", format="A4"),
+                                  os.path.join(ctx.seat_plan_output_folder, "Seating_Plans.pdf"), ctx)
+        render_jobs_to_single_pdf(attendance_jobs, BookmarkedPDF(orientation="P", unit="mm", format="A4"),
+                                  os.path.join(ctx.attendance_output_folder, "Attendance_Sheets.pdf"), ctx)
+    else:
+        jobs = seat_jobs + attendance_jobs + jobs
+    return run_render_jobs(jobs, ctx=ctx)
 
 # ============================================================
 # ATTENDANCE SHEETS GENERATION FUNCTION
 # ============================================================
-def generate_attendance_sheets(df_students, metadata, seating_assignments, output_dir):
-    os.makedirs(ATTENDANCE_OUTPUT_FOLDER, exist_ok=True)
+def generate_attendance_sheets(df_students, metadata, seating_assignments, output_dir, combined=False, ctx=None):
+    ctx = ctx or GenerationContext()
+    os.makedirs(ctx.attendance_output_folder, exist_ok=True)
+    jobs, remaining = attendance_sheet_jobs(df_students, metadata, seating_assignments, ctx)
+    if combined:
+        render_jobs_to_single_pdf(jobs, BookmarkedPDF(orientation="P", unit="mm", format="A4"),
+                                  os.path.join(ctx.attendance_output_folder, "Attendance_Sheets.pdf"), ctx)
+    else:
+        run_render_jobs(jobs, ctx=ctx)
+    return remaining
+
+def attendance_sheet_jobs(df_students, metadata, seating_assignments, ctx=None):
+    """Return (render jobs, seats no roster group claimed): one job per course group and room."""
+    ctx = ctx or GenerationContext()
     unique_assignments = {}
     for s in seating_assignments:
         sid = str(s.get("Student ID", "")).strip()
@@ -934,95 +2006,75 @@ def generate_attendance_sheets(df_students, metadata, seating_assignments, outpu
         key = (sid, room)
         unique_assignments[key] = s
     seating_assignments = list(unique_assignments.values())
-    grouped = df_students.groupby(["Faculty Name", "Batch Number", "Section"])
-    for group_keys, group_df in grouped:
-        group_df = group_df.drop_duplicates(subset=["Student ID"])
-        faculty_name, batch_number, section = group_keys
-        first_row = group_df.iloc[0]
-        group_info = {
-            "Faculty ID": first_row.get("Faculty ID", ""),
-            "Faculty Name": faculty_name,
-            "Program": first_row.get("Program", ""),
-            "Batch Number": batch_number,
-            "Course Code": first_row.get("Course Code", ""),
-            "Course Title": first_row.get("Course Title", ""),
-            "Credits": first_row.get("Credits", ""),
-            "Section": section,
+    group_columns = ["Faculty Name", "Batch Number", "Section"]
+    # Roster rows tagged with their (Faculty Name, Batch Number, Section) group,
+    # numbered in the same sorted order groupby() iterates in.
+    roster = df_students.copy()
+    roster["_group"] = roster.groupby(group_columns).ngroup()
+    roster = roster[roster["_group"].notna()]
+    roster["_group"] = roster["_group"].astype(int)
+    roster = roster.drop_duplicates(subset=["_group", "Student ID"])
+    roster["_sid"] = roster["Student ID"].astype(str)
+    roster["_row"] = range(len(roster))
+    # A seated student belongs to the first group that lists them.
+    group_of_student = roster.assign(_key=roster["Student ID"].astype(str).str.strip()).groupby("_key")["_group"].min()
+    seats = pd.DataFrame({
+        "_sid": pd.Series([sid for sid, _ in unique_assignments], dtype=str),
+        "_room": pd.Series([room for _, room in unique_assignments], dtype=str),
+    })
+    seats["_group"] = seats["_sid"].map(group_of_student)
+    remaining = [s for s, claimed in zip(seating_assignments, seats["_group"].notna()) if not claimed]
+    seats = seats[seats["_group"].notna() & (seats["_room"] != "")]
+    if roster.empty or seats.empty:
+        return [], remaining  # e.g. every roster PDF failed to parse: no sheets to draw
+    seats["_group"] = seats["_group"].astype(int)
+    # Rooms are listed in the order their first seat appears for the group.
+    seats["_room_order"] = seats.groupby(["_group", "_room"], sort=False).ngroup()
+    sheets = roster.merge(seats, on=["_group", "_sid"], how="inner")
+    sheets = sheets.sort_values(["_group", "_room_order", "_row"], kind="stable")
+    group_info_by_id = {}
+    for row in roster.drop_duplicates(subset=["_group"]).to_dict("records"):
+        group_info_by_id[row["_group"]] = {
+            "Faculty ID": row.get("Faculty ID", ""),
+            "Faculty Name": row["Faculty Name"],
+            "Program": row.get("Program", ""),
+            "Batch Number": row["Batch Number"],
+            "Course Code": row.get("Course Code", ""),
+            "Course Title": row.get("Course Title", ""),
+            "Credits": row.get("Credits", ""),
+            "Section": row["Section"],
         }
-        group_student_ids = set(group_df["Student ID"].astype(str).str.strip())
-        group_seat_assignments = [s for s in seating_assignments if str(s.get("Student ID", "")).strip() in group_student_ids]
-        seating_assignments = [s for s in seating_assignments if str(s.get("Student ID", "")).strip() not in group_student_ids]
-        assignments_by_room = {}
-        for s in group_seat_assignments:
-            room = str(s.get("Room") or s.get("Room No") or "").strip()
-            if room != "":
-                assignments_by_room.setdefault(room, []).append(s)
-        for room, seat_list in assignments_by_room.items():
-            room_student_ids = set(str(s.get("Student ID", "")).strip() for s in seat_list)
-            room_students_df = group_df[group_df["Student ID"].astype(str).isin(room_student_ids)]
-            room_students_df = room_students_df.drop_duplicates(subset=["Student ID"])
-            room_student_list = []
-            for _, row in room_students_df.iterrows():
-                room_student_list.append({
-                    "Student ID": str(row.get("Student ID", "")).strip(),
-                    "Student Name": row.get("Student Name", ""),
-                    "M Batch": row.get("M Batch", "")
-                })
-            generate_attendance_sheet_pdf(group_info, room_student_list, metadata, room, {room: len(room_student_list)}, ATTENDANCE_OUTPUT_FOLDER)
-    return seating_assignments
-
-# ============================================================
-# UTILITY: Clear OUTPUT_FOLDER BEFORE RUNNING (to avoid old files)
-# ============================================================
-import shutil
-
-import shutil
-
-def clear_output_folder():
-    if os.path.exists(OUTPUT_FOLDER):
-        try:
-            shutil.rmtree(OUTPUT_FOLDER)
-            print(f"Removed the entire output folder: {OUTPUT_FOLDER}")
-        except Exception as e:
-            print(f"Error removing {OUTPUT_FOLDER}: {e}")
-    # Recreate the output folder and its subfolders
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    os.makedirs(SEAT_PLAN_OUTPUT_FOLDER, exist_ok=True)
-    os.makedirs(ATTENDANCE_OUTPUT_FOLDER, exist_ok=True)
-
-
+    jobs = []
+    for (group_id, room), sheet in sheets.groupby(["_group", "_room"], sort=False):
+        room_student_list = [
+            {
+                "Student ID": str(student_id).strip(),
+                "Student Name": name,
+                "M Batch": m_batch,
+            }
+            for student_id, name, m_batch in zip(sheet["Student ID"], sheet["Student Name"], sheet["M Batch"])
+        ]
+        jobs.append((generate_attendance_sheet_pdf, (group_info_by_id[group_id], room_student_list, metadata, room,
+                                                     {room: len(room_student_list)}, ctx.attendance_output_folder, ctx)))
+    return jobs, remaining
 
 # ============================================================
 # MAIN FUNCTION
 # ============================================================
 def main():
+    ctx = GenerationContext()
     # Clear the entire output folder (except the persistent room_info file)
     from shutil import rmtree
-    if os.path.exists(OUTPUT_FOLDER):
+    if os.path.exists(ctx.output_folder):
         try:
-            rmtree(OUTPUT_FOLDER)
-            print(f"Removed the entire output folder: {OUTPUT_FOLDER}")
+            rmtree(ctx.output_folder)
+            print(f"Removed the entire output folder: {ctx.output_folder}")
         except Exception as e:
-            print(f"Error removing {OUTPUT_FOLDER}: {e}")
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
-    os.makedirs(SEAT_PLAN_OUTPUT_FOLDER, exist_ok=True)
-    os.makedirs(ATTENDANCE_OUTPUT_FOLDER, exist_ok=True)
+            print(f"Error removing {ctx.output_folder}: {e}")
+    os.makedirs(ctx.output_folder, exist_ok=True)
+    ctx.make_output_folders()
 
-    merge_pdf_data_to_excel()
-    try:
-        df_students = pd.read_excel(MERGED_EXCEL_PATH)
-        print("Student data loaded successfully!")
-    except Exception as e:
-        print(f"Error loading student data: {e}")
-        return
-
-    # Read room info from a single sheet (Sheet1)
-    try:
-        df_rooms = pd.read_excel(get_room_info_path())  # only one sheet needed
-        print("Room data loaded successfully!")
-    except Exception as e:
-        print(f"Error loading room data: {e}")
-        return
+    merge_pdf_data_to_excel(ctx=ctx)
 
     # Set default metadata (these values can be overridden via the form if desired)
     metadata = {
@@ -1034,58 +2086,12 @@ def main():
         "Program": "BSc in Civil Engineering (For Diploma Holder)",
         "Day": "Wednesday"
     }
-
-    seating_assignments = generate_seating_plan_display(df_students, df_rooms, metadata, OUTPUT_FOLDER, produce_pdf=True)
-    unique_assignments = {}
-    for s in seating_assignments:
-        sid = str(s.get("Student ID", "")).strip()
-        room = str(s.get("Room") or s.get("Room No") or "").strip()
-        key = (sid, room)
-        unique_assignments[key] = s
-    seating_assignments = list(unique_assignments.values())
-
-    generate_attendance_sheets(df_students, metadata, seating_assignments, OUTPUT_FOLDER)
-
-    try:
-        df_courses = pd.read_excel(MERGED_EXCEL_PATH)
-        print("Courses data loaded successfully!")
-    except Exception as e:
-        print(f"Error loading courses data: {e}")
-        return
-
     # Use default exam details for envelopes (instead of reading Sheet3)
     exam_details = {
         "Exam Line1": "MAKEUP SEMESTER FINAL EXAM",
         "Exam Line2": "FALL 2024 SEMESTER"
     }
-
-    envelope_list = generate_envelope_data(df_courses)
-    envelopes_output_file = os.path.join(OUTPUT_FOLDER, "Envelopes.pdf")
-    generate_envelopes_pdf(envelope_list, exam_details, envelopes_output_file)
-
-    try:
-        # For summary, we use the same default metadata as above.
-        summary_header = {
-            "Term": metadata.get("Term", ""),
-            "Semester": metadata.get("Semester", ""),
-            "Shift": metadata.get("Shift", ""),
-            "Exam date": metadata.get("Exam date", ""),
-            "Time": metadata.get("Time", ""),
-            "Day": metadata.get("Day", "")
-        }
-        print("Using default summary header details!")
-    except Exception as e:
-        print(f"Error loading summary header details: {e}")
-        summary_header = {
-            "Term": "Final",
-            "Semester": "Fall 2024",
-            "Shift": "Evening",
-            "Exam date": "12/4/2024",
-            "Time": "6:30PM-8:30PM",
-            "Day": "Wednesday"
-        }
-    summary_output_file = os.path.join(OUTPUT_FOLDER, "Summary.pdf")
-    generate_summary_pdf(df_students, seating_assignments, summary_header, summary_output_file)
+    generate_all(metadata=metadata, exam_details=exam_details, ctx=ctx)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,9 @@
+import pandas as pd
+import seat_plan_generator as spg
+
+def test_empty_roster_gives_no_attendance_sheets():
+    # What the merged store holds when every uploaded roster failed to parse.
+    df_students = spg.excel_typed_frame(pd.DataFrame(columns=spg.ROSTER_COLUMNS))
+    seat = {"Room": "101", "Row": 1, "Column": 1, "Student ID": "2229390001", "Batch": "29"}
+    assert spg.attendance_sheet_jobs(df_students, {}, []) == ([], [])
+    assert spg.attendance_sheet_jobs(df_students, {}, [seat]) == ([], [seat])
@@ -0,0 +1,44 @@
+import seat_plan_generator as spg
+
+# First-page text of a real roster: the program name wraps in its cell and
+# the text layer puts the "Program" label, followed by the next column's
+# "Batch Number", between the two halves.
+ROSTER_HEADER = """UTTARA UNIVERSITY
+Faculty ID 240224 Faculty Name Md. Monirul Islam Munna
+BSc in Civil Engineering (For Diploma
+Program Batch Number 29
+Holder)
+Course Code CE4019 Section A
+Course Title DYNAMICS OF STRUCTURE Credits 2.0"""
+
+def test_real_roster_layout():
+    metadata, missing = spg.parse_roster_header(ROSTER_HEADER)
+    assert missing == []
+    assert metadata == {
+        "Program": "BSc in Civil Engineering (For Diploma Holder)",
+        "Faculty ID": "240224",
+        "Faculty Name": "Md. Monirul Islam Munna",
+        "Batch Number": "29",
+        "Course Code": "CE4019",
+        "Course Title": "DYNAMICS OF STRUCTURE",
+        "Credits": "2.0",
+        "Section": "A",
+    }
+
+def test_single_token_labels_ignore_case():
+    metadata, _ = spg.parse_roster_header(ROSTER_HEADER.replace("Batch Number", "Batch number"))
+    assert metadata["Batch Number"] == "29"
+
+def test_program_runs_on_until_a_later_batch_number_line():
+    text = ('Program "BSc in Computer Science and\n'
+            "Engineering\"\nBatch Number 31 Section B\nCourse Code CSE101\n"
+            "Course Title COURSE TITLE WITH CAPITALS Credits 3.0")
+    metadata, missing = spg.parse_roster_header(text)
+    assert metadata["Program"] == "BSc in Computer Science and Engineering"
+    assert metadata["Course Title"] == "COURSE TITLE WITH CAPITALS"
+    assert missing == ["Faculty ID", "Faculty Name"]
+
+def test_program_on_its_label_line_takes_no_lines_above():
+    text = "UTTARA UNIVERSITY\nProgram BSc in Computer Science\nBatch Number 31"
+    metadata, _ = spg.parse_roster_header(text)
+    assert metadata["Program"] == "BSc in Computer Science"
@@ -0,0 +1,50 @@
+"""Golden-output tests for seat assignment.
+
+room_info_unblocked.csv has no "Blocked Seats" column, so it runs on the
+original algorithm too; its expected file was written by the baseline commit
+and pins today's assignments to the original ones, in both the two-batch and
+the leftover mode. Do not regenerate it from the current code.
+
+room_info.csv adds blocked seats, including in a leftover-mode room. Its
+expected file comes from the current code; if a change to that seating is
+intended, regenerate it with
+
+    python tests/test_seating.py
+"""
+import os
+import json
+import pandas as pd
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+BASELINE_EXPECTED_PATH = os.path.join(FIXTURES, "expected_seat_assignments_baseline.json")
+BLOCKED_EXPECTED_PATH = os.path.join(FIXTURES, "expected_seat_assignments_blocked.json")
+
+def seat_fixture(room_file):
+    import seat_plan_generator as spg
+    df_students = pd.read_csv(os.path.join(FIXTURES, "roster.csv"))
+    df_rooms = pd.read_csv(os.path.join(FIXTURES, room_file))
+    return spg.generate_seating_plan_display(df_students, df_rooms, {}, "", produce_pdf=False)
+
+def load_expected(path):
+    with open(path) as f:
+        return json.load(f)
+
+def test_seat_assignments_match_baseline_algorithm():
+    assert seat_fixture("room_info_unblocked.csv") == load_expected(BASELINE_EXPECTED_PATH)
+
+def test_seat_assignments_with_blocked_seats_match_golden_output():
+    assert seat_fixture("room_info.csv") == load_expected(BLOCKED_EXPECTED_PATH)
+
+def test_no_student_is_seated_on_a_blocked_seat():
+    import seat_plan_generator as spg
+    rooms = spg.build_room_index(pd.read_csv(os.path.join(FIXTURES, "room_info.csv")))
+    seats = seat_fixture("room_info.csv")
+    assert not [seat for seat in seats if (seat["Row"], seat["Column"]) in rooms[seat["Room"]]["blocked"]]
+    assert len({seat["Student ID"] for seat in seats}) == len(pd.read_csv(os.path.join(FIXTURES, "roster.csv")))
+
+if __name__ == "__main__":
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    with open(BLOCKED_EXPECTED_PATH, "w") as f:
+        json.dump(seat_fixture("room_info.csv"), f, indent=1)
+    print(f"Wrote {BLOCKED_EXPECTED_PATH}")
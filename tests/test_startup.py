@@ -0,0 +1,25 @@
+import os
+import sys
+import json
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["seat_plan_generator", "pandas", "fpdf", "pdfplumber"]
+# Loose on purpose: a cold import of the heavy stack takes several seconds,
+# importing the app without it well under one.
+STARTUP_BUDGET_SECONDS = 5.0
+
+def test_app_import_skips_heavy_libraries(tmp_path):
+    script = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        "import app\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT, capture_output=True, text=True,
+                            env=dict(os.environ, WARM_UP="0", JOBS_FOLDER=str(tmp_path)), timeout=60)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["loaded"] == []
+    assert report["elapsed"] < STARTUP_BUDGET_SECONDS